@@ -3,14 +3,68 @@ import csv
 import json
 from datetime import datetime
 from django.contrib import admin, messages
+from django.contrib.admin.views.main import ChangeList
 from django.urls import path, reverse
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib import messages
 from django.http import HttpResponse, JsonResponse, HttpResponseRedirect
 from django.template.response import TemplateResponse
 from django.core.exceptions import ValidationError
-from .models import User, BingoBoard, BingoBoardItem, BingoGame, Player, GameEvent, Feedback
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.utils.functional import cached_property
+from .models import User, BingoBoard, BingoBoardItem, BingoGame, Player, GameEvent, GameSummary, Feedback
 from .forms import BingoBoardForm, BingoBoardItemFormSet
+from .session import invalidate_sessions
+from .groups import group_send_sync
+from .presence import presence
+from . import layouts
+
+class EstimatedCountPaginator(Paginator):
+    """Paginator for huge tables that never counts every row.
+
+    An unfiltered list takes the database's own row estimate where it keeps
+    one (PostgreSQL, MySQL). Anything else is counted up to MAX_COUNT rows,
+    so the last pages of a huge filtered list are simply not linked.
+    """
+    MAX_COUNT = 10_000
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not queryset.query.where:
+            estimate = estimated_rows(queryset.model, queryset.db)
+            if estimate is not None and estimate > self.MAX_COUNT:
+                return estimate
+        return queryset[:self.MAX_COUNT].count()
+
+
+def estimated_rows(model, using='default'):
+    """The planner's idea of how many rows a table has, or None if the database doesn't say"""
+    connection = connections[using]
+    table = model._meta.db_table
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute('SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass', [table])
+        elif connection.vendor == 'mysql':
+            cursor.execute(
+                'SELECT table_rows FROM information_schema.tables WHERE table_schema = DATABASE() AND table_name = %s',
+                [table],
+            )
+        else:
+            return None
+        row = cursor.fetchone()
+    # PostgreSQL says -1 for a table that was never analyzed
+    return row[0] if row and row[0] is not None and row[0] >= 0 else None
+
+
+def count_of(model, field):
+    """Annotation counting the rows of ``model`` whose ``field`` points at the outer row"""
+    rows = model.objects.filter(**{field: OuterRef('pk')}).order_by().values(field)
+    return Coalesce(Subquery(rows.annotate(count=Count('pk')).values('count'), output_field=IntegerField()), 0)
+
 
 @admin.register(Feedback)
 class FeedbackAdmin(admin.ModelAdmin):
@@ -19,6 +73,15 @@ class FeedbackAdmin(admin.ModelAdmin):
 @admin.register(GameEvent)
 class GameEventAdmin(admin.ModelAdmin):
     list_display = ('player__name', 'game__code', 'message', 'created_at')
+    list_select_related = ('player', 'game')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+@admin.register(GameSummary)
+class GameSummaryAdmin(admin.ModelAdmin):
+    list_display = ('game', 'events', 'first_event_at', 'last_event_at', 'updated_at')
+    list_select_related = ('game',)
+    readonly_fields = ('game', 'compacted_at', 'compacted_id')
 
 @admin.register(User)
 class UserAdmin(admin.ModelAdmin):
@@ -37,8 +100,15 @@ class BingoBoardItemInline(admin.TabularInline):
 class BingoBoardAdmin(admin.ModelAdmin):
     list_display = ('name', 'creator', 'created_at', 'item_count', 'times_used')
     list_filter = ('created_at', 'creator')
+    list_select_related = ('creator',)
     search_fields = ('name', 'creator__username')
     inlines = [BingoBoardItemInline]
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(
+            item_count=count_of(BingoBoardItem, 'board'),
+            times_used=count_of(BingoGame, 'board'),
+        )
     
     def get_urls(self):
         urls = super().get_urls()
@@ -67,12 +137,14 @@ class BingoBoardAdmin(admin.ModelAdmin):
         return custom_urls + urls
         
     def item_count(self, obj):
-        return obj.items.count()
+        return obj.item_count
     item_count.short_description = 'Number of Items'
+    item_count.admin_order_field = 'item_count'
     
     def times_used(self, obj):
-        return BingoGame.objects.filter(board=obj).count()
+        return obj.times_used
     times_used.short_description = 'Times Used in Games'
+    times_used.admin_order_field = 'times_used'
     
     def duplicate_board(self, request, board_id):
         board = get_object_or_404(BingoBoard, id=board_id)
@@ -81,11 +153,11 @@ class BingoBoardAdmin(admin.ModelAdmin):
             creator=request.user
         )
         
-        for item in board.items.all():
-            BingoBoardItem.objects.create(
-                board=new_board,
-                text=item.text
-            )
+        BingoBoardItem.objects.bulk_create(
+            BingoBoardItem(board=new_board, text=text)
+            for text in board.items.values_list('text', flat=True)
+        )
+        layouts.invalidate(new_board.id)
         
         messages.success(request, f"Successfully duplicated board '{board.name}'")
         return HttpResponseRedirect(
@@ -129,12 +201,8 @@ class BingoBoardAdmin(admin.ModelAdmin):
                 )
 
                 # Create board items
-                for text in items:
-                    print(text)
-                    BingoBoardItem.objects.create(
-                        board=board,
-                        text=text,
-                    )
+                BingoBoardItem.objects.bulk_create(BingoBoardItem(board=board, text=text) for text in items)
+                layouts.invalidate(board.id)
 
                 messages.success(request, f'Successfully imported board "{board_name}" with {len(items)} items')
                 return HttpResponseRedirect(
@@ -199,16 +267,26 @@ class BingoGameAdmin(admin.ModelAdmin):
     list_display = ('code', 'name', 'board', 'creator', 'created_at', 'is_active', 'is_spectateable', 'player_count', 'has_winner')
     list_filter = ('is_active', 'created_at', 'has_free_square')
     list_editable = ('is_active','is_spectateable')
+    list_select_related = ('board', 'creator')
     search_fields = ('code', 'creator__username', 'board__name')
     readonly_fields = ('code',)
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(player_count=count_of(Player, 'game'))
     
     def player_count(self, obj):
-        return obj.players.count()
+        return obj.player_count
     player_count.short_description = 'Number of Players'
+    player_count.admin_order_field = 'player_count'
     
     def has_winner(self, obj):
-        return bool(obj.winner)
+        return obj.winner_id is not None
     has_winner.boolean = True
+
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        if change:
+            invalidate_sessions(obj.code)
     
     def get_urls(self):
         urls = super().get_urls()
@@ -227,12 +305,9 @@ class BingoGameAdmin(admin.ModelAdmin):
         game.save()
         
         # Notify all players through WebSocket
-        from channels.layers import get_channel_layer
-        from asgiref.sync import async_to_sync
-        
-        channel_layer = get_channel_layer()
-        async_to_sync(channel_layer.group_send)(
-            f'game_{game.id}',
+        invalidate_sessions(game.code)
+        group_send_sync(
+            game.code,
             {
                 'type': 'game_update',
                 'message': 'Game ended by administrator'
@@ -244,10 +319,47 @@ class BingoGameAdmin(admin.ModelAdmin):
             reverse('admin:bingo_bingogame_changelist')
         )
 
+def _is_connected(player, connected) -> bool:
+    """Whether a player is online, given ``{game code: connected players}`` gathered so far"""
+    code = player.game.code
+    if code is None:
+        # Recycled codes belong to ended games, which nobody is connected to
+        return False
+    if code not in connected:
+        connected[code] = presence.connected_sync(code)
+    return player.id in connected[code]
+
+
+class PlayerChangeList(ChangeList):
+    def get_results(self, request):
+        super().get_results(request)
+        # One presence lookup per game on the page instead of one per row, for this request only
+        connected = {}
+        for player in self.result_list:
+            player.connected = _is_connected(player, connected)
+
+
 @admin.register(Player)
 class PlayerAdmin(admin.ModelAdmin):
     list_display = ('name', 'game', 'created_at', 'is_connected', 'has_won')
-    list_filter = ('has_won', 'is_connected', 'created_at')
+    list_filter = ('has_won', 'created_at')
+    list_select_related = ('game',)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
     search_fields = ('name', 'game__code')
     readonly_fields = ('covered_positions',)
 
+    def get_changelist(self, request, **kwargs):
+        return PlayerChangeList
+
+    def is_connected(self, obj):
+        if hasattr(obj, 'connected'):
+            return obj.connected
+        return _is_connected(obj, {})
+    is_connected.boolean = True
+
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        if change:
+            invalidate_sessions(obj.game.code, player_id=obj.id)
+
@@ -4,3 +4,10 @@ from django.apps import AppConfig
 class BingoConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'bingo'
+
+    def ready(self):
+        from .fragments import fragments
+        fragments.compile()
+        # Connects the signals that drop cached item tables and snapshots when items change,
+        # and the cached lobby when games or boards do
+        from . import itemtable, layouts, lobby  # noqa: F401
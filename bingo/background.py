@@ -0,0 +1,62 @@
+# bingo/background.py
+"""Background tasks on the consumers' event loop.
+
+The buffers that write or publish in batches each run one task on the loop
+the consumers run on. ``start`` is called when a socket connects and starts
+every enabled task that isn't running yet. Any thread can ``wake`` a task
+early; a process without a running loop, like a management command, gets
+False back and handles the work itself.
+"""
+import abc
+import asyncio
+
+_tasks = []
+
+
+class BackgroundTask(abc.ABC):
+    """A lazily started task that sleeps until woken or its interval passes"""
+
+    enabled = True
+
+    def __init__(self):
+        self._loop = None
+        self._wakeup = None
+        self._task = None
+        _tasks.append(self)
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done() and not self._loop.is_closed()
+
+    def start(self):
+        """Run the task on the current event loop if it isn't already"""
+        if not self.running:
+            self._loop = asyncio.get_running_loop()
+            self._wakeup = asyncio.Event()
+            self._task = self._loop.create_task(self._run())
+
+    def wake(self) -> bool:
+        """Wake the task now. Safe to call from any thread; False if it isn't running."""
+        if not self.running:
+            return False
+        self._loop.call_soon_threadsafe(self._wakeup.set)
+        return True
+
+    async def wait(self, timeout=None):
+        """Sleep until woken, or at most ``timeout`` seconds"""
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        self._wakeup.clear()
+
+    @abc.abstractmethod
+    async def _run(self):
+        """The task itself: loop forever, doing the batched work each time ``wait`` returns"""
+
+
+def start():
+    """Start every enabled background task on the current event loop"""
+    for task in _tasks:
+        if task.enabled:
+            task.start()
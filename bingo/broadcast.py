@@ -0,0 +1,193 @@
+# bingo/broadcast.py
+"""Building and broadcasting game events to a game's group.
+
+Marks are the noisy part: players tap several squares in a row, or mark and
+unmark the same one. With coalescing on, marks are held for a short window
+per game. In that window each player's marks are summarised into one event,
+and squares that ended where they started are dropped. All of a game's
+events for the window then go out in one ``player_events`` group message.
+"""
+import asyncio
+import contextlib
+import logging
+from django.conf import settings
+from django.utils import timezone
+from .models import GameEvent
+from .eventsink import event_sink
+from .fragments import fragments
+from .replay import replay
+from . import protocol
+from . import groups
+
+logger = logging.getLogger(__name__)
+
+PLAYER_EVENT_LIFETIME = 90
+
+DEFAULTS = {
+    'ENABLED': True,
+    'WINDOW': 0.5,   # seconds marks are held before they are broadcast
+}
+
+
+def render_event(game_event: dict, remove_in: int) -> str:
+    """Render a game event as an out-of-band swap into the events list"""
+    context = dict(game_event, remove_in=remove_in)
+    context['class'] = 'winning-message' if "BINGO" in game_event['message'] else ''
+    event_html : str = fragments.render_event(context)
+    return f'<div hx-swap-oob="afterbegin:#events-list">{event_html}</div>'
+
+
+async def build_player_event(game_code, player, message, sender, created_at=None) -> dict:
+    """Save a game event, number it and render it for every kind of receiver"""
+    created_at = created_at or timezone.now()
+    game_event = {
+        'player': player.name,
+        'message': message,
+        'created_at': created_at.timestamp()*1000,
+    }
+    game_event['seq'] = await replay.append_event(game_code, dict(game_event, player_id=player.id))
+    if not getattr(settings, 'FORGET_GAME_EVENTS', False):
+        game_event_object = GameEvent(
+            game_id=player.game_id,
+            player=player,
+            message=message,
+            created_at=created_at,
+        )
+        if event_sink.enabled:
+            event_sink.add(game_event_object)
+        else:
+            await game_event_object.asave()
+
+    # Render once here rather than once per receiving consumer
+    return {
+        'type': 'player_event',
+        'game_event': game_event,
+        'html': render_event(game_event, remove_in=PLAYER_EVENT_LIFETIME),
+        'spectator_html': render_event(game_event, remove_in=0),
+        'delta': protocol.event(game_event, remove_in=PLAYER_EVENT_LIFETIME),
+        'spectator_delta': protocol.event(game_event),
+        'player_id': player.id,
+        'sender': sender,
+    }
+
+
+class PendingMarks:
+    """One player's marks from one connection during the current window"""
+    __slots__ = ('player', 'sender', 'squares', 'last_at')
+
+    def __init__(self, player, sender):
+        self.player = player
+        self.sender = sender
+        self.squares = {}   # position -> [text, covered before the window, covered now]
+        self.last_at = None
+
+    def toggle(self, position, text, covered):
+        if position in self.squares:
+            self.squares[position][2] = covered
+        else:
+            self.squares[position] = [text, not covered, covered]
+        self.last_at = timezone.now()
+
+    def message(self):
+        """The summary, or None if every change was undone"""
+        marked = [f"'{text}'" for text, before, now in self.squares.values() if now and not before]
+        unmarked = [f"'{text}'" for text, before, now in self.squares.values() if before and not now]
+        actions = []
+        if marked:
+            actions.append(f"marked {', '.join(marked)}")
+        if unmarked:
+            actions.append(f"unmarked {', '.join(unmarked)}")
+        if not actions:
+            return None
+        return f"{self.player.name} {' and '.join(actions)}"
+
+
+class EventCoalescer:
+    """Per-game windows that merge marks before they are broadcast"""
+
+    def __init__(self):
+        self._pending = {}   # game code -> {(player id, sender): PendingMarks}
+        self._timers = {}    # game code -> TimerHandle
+        self._locks = {}     # game code -> [asyncio.Lock, holders and waiters]
+        self._flushes = set()  # pending flush tasks, kept so they aren't garbage collected
+
+    def _config(self, key):
+        return getattr(settings, 'EVENT_COALESCING', {}).get(key, DEFAULTS[key])
+
+    @property
+    def enabled(self) -> bool:
+        return self._config('ENABLED') and self._config('WINDOW') > 0
+
+    @property
+    def window(self) -> float:
+        return self._config('WINDOW')
+
+    def mark(self, game_code, player, sender, position, text, covered):
+        """Hold a mark or unmark until the game's window closes"""
+        marks = self._pending.setdefault(game_code, {})
+        key = (player.id, sender)
+        if key not in marks:
+            marks[key] = PendingMarks(player, sender)
+        marks[key].toggle(position, text, covered)
+        if game_code not in self._timers:
+            loop = asyncio.get_running_loop()
+            self._timers[game_code] = loop.call_later(self.window, self._flush_later, game_code)
+
+    @contextlib.asynccontextmanager
+    async def _locked(self, game_code):
+        """Take a game's held marks and send them one caller at a time, so sequence numbers go out in order"""
+        entry = self._locks.setdefault(game_code, [asyncio.Lock(), 0])
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                yield
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                del self._locks[game_code]
+
+    async def event(self, game_code, player, sender, message):
+        """Broadcast an event now, after the marks that came before it"""
+        async with self._locked(game_code):
+            events = await self._take(game_code)
+            events.append(await build_player_event(game_code, player, message, sender))
+            await self._send(game_code, events)
+
+    async def flush(self, game_code):
+        """Broadcast a game's held marks without waiting for the window"""
+        async with self._locked(game_code):
+            events = await self._take(game_code)
+            if events:
+                await self._send(game_code, events)
+
+    def _flush_later(self, game_code):
+        self._timers.pop(game_code, None)
+        task = asyncio.get_running_loop().create_task(self._flush_logged(game_code))
+        self._flushes.add(task)
+        task.add_done_callback(self._flushes.discard)
+
+    async def _flush_logged(self, game_code):
+        try:
+            await self.flush(game_code)
+        except Exception:
+            logger.exception(f"Error broadcasting coalesced events for game {game_code}")
+
+    async def _take(self, game_code) -> list:
+        timer = self._timers.pop(game_code, None)
+        if timer:
+            timer.cancel()
+        events = []
+        for marks in self._pending.pop(game_code, {}).values():
+            message = marks.message()
+            if message:
+                events.append(await build_player_event(game_code, marks.player, message, marks.sender, marks.last_at))
+        return events
+
+    async def _send(self, game_code, events):
+        await groups.group_send(game_code, {
+            'type': 'player_events',
+            'events': events,
+        })
+
+
+coalescer = EventCoalescer()
@@ -1,30 +1,81 @@
 # bingo/consumers.py
+import asyncio
 import json
 import logging
-from asgiref.sync import async_to_sync
-from django.template.loader import render_to_string
-from django.utils import timezone
-from django.conf import settings
-from channels.generic.websocket import AsyncWebsocketConsumer
+import time
+from urllib.parse import parse_qs
 from channels.db import database_sync_to_async
-from .models import Player, BingoGame, BingoBoardItem, GameEvent
+from channels.generic.websocket import AsyncWebsocketConsumer
+from .models import Player, BingoGame, BingoBoardItem
 from .forms import SuggestionForm, PlayerNameChangeForm, FeedbackForm
+from .session import PlayerSession
+from .writebehind import coverage_buffer
+from .eventsink import event_sink
+from .presence import presence
+from .fragments import fragments, arender_to_string
+from .broadcast import coalescer, build_player_event, render_event, PLAYER_EVENT_LIFETIME
+from .ratelimit import rate_limiter
+from .replay import replay, BOARD
+from . import protocol
+from . import groups
+from . import lobby
+from . import timeline
+from . import background
 
 logger = logging.getLogger(__name__)
 
+THROTTLE_NOTICE_INTERVAL = 1.0
+
+
+def requested_last_seq(scope):
+    """The ``last_seq`` a reconnecting client sent in the query string, if any"""
+    query = parse_qs(scope.get('query_string', b'').decode())
+    try:
+        return int(query['last_seq'][0])
+    except (KeyError, ValueError):
+        return None
+
+
+class LobbyConsumer(AsyncWebsocketConsumer):
+    """Keeps an open home page's games list current"""
+
+    async def connect(self):
+        user = self.scope.get('user')
+        self.signed_in = bool(user and user.is_authenticated)
+        await self.channel_layer.group_add(lobby.LOBBY_GROUP, self.channel_name)
+        await self.accept()
+        background.start()
+        # Anything that changed since the page was rendered, or while reconnecting
+        current = await database_sync_to_async(lobby.current)()
+        await self.send(await lobby.arender_games(current['games'], self.signed_in))
+
+    async def disconnect(self, close_code):
+        await self.channel_layer.group_discard(lobby.LOBBY_GROUP, self.channel_name)
+
+    async def receive(self, text_data=None, bytes_data=None):
+        # The lobby only listens
+        pass
+
+    async def lobby_update(self, event):
+        await self.send(event['signed_in_html'] if self.signed_in else event['html'])
+
+
 class SpectatorConsumer(AsyncWebsocketConsumer):
     async def connect(self):
         logger.info(f"Attempting to connect spectator to game...")
         try:
             self.code = self.scope['url_route']['kwargs']['game_code']
             self.game = await self.get_game()
-            self.game_group_name = f'game_{self.game.code}'
+            self.game_group_name = groups.spectator_group(self.game.code, self.channel_name)
+            self.delta = protocol.negotiate(self.scope)
             await self.channel_layer.group_add(
                 self.game_group_name,
                 self.channel_name
             )
-            await self.accept()
-            self.send(text_data="Welcome")
+            await self.accept(subprotocol=self.delta)
+            last_seq = requested_last_seq(self.scope)
+            if last_seq is not None:
+                await self.resume(last_seq)
         except BingoGame.DoesNotExist:
             logger.error(f"Game not found for spectator with code {self.code}")
             return
@@ -45,10 +96,23 @@ class SpectatorConsumer(AsyncWebsocketConsumer):
         except Exception as e:
             logger.exception("Error in disconnect")
 
-    @database_sync_to_async
-    def get_game(self):
+    async def resume(self, last_seq):
+        """Send a reconnecting spectator the events it missed, or the newest page if too many"""
+        missed = await replay.since(self.game.code, None, last_seq)
+        if missed is not None:
+            for game_event in missed.events:
+                await self.send(protocol.event(game_event) if self.delta else render_event(game_event, remove_in=0))
+            return
+        if not self.delta:
+            _, events, next_cursor = await timeline.aevents_page(self.game)
+            items = await arender_to_string('bingo/partials/event_page.html', {
+                'game': self.game, 'events': events, 'next_cursor': next_cursor,
+            })
+            await self.send(f'<div id="events-list" class="events-list">{items}</div>')
+
+    async def get_game(self):
         try:
-            game: BingoGame = BingoGame.objects.get(code=self.code)
+            game: BingoGame = await BingoGame.objects.aget(code=self.code)
             logger.info(f"Found game: {game.name} for game: {game.code}")
             return game
         except BingoGame.DoesNotExist:
@@ -58,16 +122,19 @@ class SpectatorConsumer(AsyncWebsocketConsumer):
             logger.exception(f"Error getting game {self.code}")
             return None
 
+    async def game_update(self, event):
+        await self.send(text_data=json.dumps(event))
+
+    async def session_invalidate(self, event):
+        # Spectators keep no player session
+        pass
 
     async def player_event(self, event):
-        game_event = event['game_event']
-        game_event['class'] = ''
-        if "BINGO" in game_event['message']:
-            game_event['class'] = 'winning-message'
-        game_event['remove_in'] = 0
-        event_html : str = render_to_string("bingo/partials/event_item.html", context={'event': game_event})
-        rendered_html = f'<div hx-swap-oob="afterbegin:#events-list">{event_html}</div>'
-        await self.send(rendered_html)
+        await self.send(event['spectator_delta'] if self.delta else event['spectator_html'])
+
+    async def player_events(self, event):
+        for game_event in event['events']:
+            await self.player_event(game_event)
 
             
 
@@ -77,19 +144,22 @@ class BingoGameConsumer(AsyncWebsocketConsumer):
         
         try:
             self.player_id = self.scope['url_route']['kwargs']['player_id']
-            self.player = await self.get_player()
+            self.delta = protocol.negotiate(self.scope)
+            self.buckets = {}
+            self.throttled_until = 0
+            self.session = await self.load_session()
             
-            if not self.player:
+            if not self.session:
                 logger.error(f"No player found with ID: {self.player_id}")
                 await self.close(code=4004)
                 return
-            
-            if not self.player.game.is_active:
-                rendered_html = render_to_string("bingo/partials/inactive_game_modal.html")
+
+            if not self.session.game.is_active:
+                rendered_html = await arender_to_string("bingo/partials/inactive_game_modal.html")
                 await self.send(rendered_html)
                 return
                 
-            self.game_group_name = f'game_{self.player.game.code}'
+            self.game_group_name = groups.player_group(self.session.game.code, self.channel_name)
             logger.info(f"Player {self.player_id} joining game group: {self.game_group_name}")
 
             # Join game group
@@ -98,11 +168,22 @@ class BingoGameConsumer(AsyncWebsocketConsumer):
                 self.channel_name
             )
 
-            await self.accept()
+            await self.accept(subprotocol=self.delta)
             logger.info(f"Connection accepted for player {self.player_id}")
+
+            # Flushers for buffered coverage and events, and lobby counts of players who just joined over HTTP
+            background.start()
+
+            rate_limiter.join(self.session.game.code)
+            await presence.join(self.session.game.code, self.player_id, self.channel_name, self.session.player.name)
+            self.heartbeat_task = asyncio.create_task(self.heartbeat())
             
-            # Send initial game state
-            await self.send_game_state()
+            # Send initial game state, or only what a returning client missed
+            last_seq = requested_last_seq(self.scope)
+            if last_seq is None:
+                await self.send_game_state()
+            else:
+                await self.resume(last_seq)
             
         except Exception as e:
             logger.exception(f"Error in connect for player_id {self.player_id}")
@@ -117,36 +198,52 @@ class BingoGameConsumer(AsyncWebsocketConsumer):
                     self.channel_name
                 )
             
-            if hasattr(self, 'player'):
-                await self.update_player_connection_status(False)
+            if hasattr(self, 'heartbeat_task'):
+                rate_limiter.leave(self.session.game.code)
+                self.heartbeat_task.cancel()
+                await presence.leave(self.session.game.code, self.player_id, self.channel_name)
+
+            if getattr(self, 'session', None):
+                if coalescer.enabled:
+                    await coalescer.flush(self.session.game.code)
+                if coverage_buffer.enabled:
+                    await coverage_buffer.aflush([self.player_id])
                 
         except Exception as e:
             logger.exception("Error in disconnect")
 
     async def receive(self, text_data):
         try:
-            player = await self.get_player()
-            if not player.game.is_active:
-                rendered_html = render_to_string("bingo/partials/inactive_game_modal.html")
+            player = self.session.player
+            if not self.session.game.is_active:
+                rendered_html = await arender_to_string("bingo/partials/inactive_game_modal.html")
                 await self.send(rendered_html)
                 return
             data = json.loads(text_data)
             message_type = data.get('type')
+            if rate_limiter.enabled:
+                retry_after = rate_limiter.check(self.buckets, self.session.game.code, message_type)
+                if retry_after is not None:
+                    await self.throttle(message_type, retry_after)
+                    return
+                if self.throttled_until:
+                    await self.clear_throttle()
             if message_type == 'mark_position':
-                player = await self.get_player()
                 position = data.get('position')
                 if position is not None:
-                    rendered_html = await self.mark_position(position)
-                    await self.send(rendered_html)
-                    winner = await self.check_win_condition()
-                    if winner:
-                        await self.create_event(
-                            player=player,
-                            message=f"{player.name} got a BINGO!! 🎉<br/>You can keep playing, though."
-                        )
-                        context : dict = { 'player': player}
-                        rendered_html : str = render_to_string("bingo/partials/winner_modal.html", context)
-                        await self.send(rendered_html)
+                    rendered = await self.mark_position(position)
+                    # Nothing changed for an off-board square or a finished game
+                    if rendered:
+                        await self.send(rendered)
+                        winner = await self.check_win_condition()
+                        if winner:
+                            await self.create_event(
+                                player=player,
+                                message=f"{player.name} got a BINGO!! 🎉<br/>You can keep playing, though."
+                            )
+                            context : dict = { 'player': player}
+                            rendered_html : str = await arender_to_string("bingo/partials/winner_modal.html", context)
+                            await self.send(rendered_html)
         
             elif message_type == 'request_state':
                 await self.send_game_state()
@@ -154,13 +251,13 @@ class BingoGameConsumer(AsyncWebsocketConsumer):
                 await self.start_new_game()
             elif message_type == 'make_suggestions':
                 context : dict = { 'form': SuggestionForm(), }
-                rendered_html : str = render_to_string("bingo/partials/suggestions_modal.html", context)
+                rendered_html : str = await arender_to_string("bingo/partials/suggestions_modal.html", context)
                 await self.send(rendered_html)
             elif message_type == 'submit_suggestions':
                 await self.process_suggestions(data)
                 await self.start_new_game()
             elif message_type == 'confirm_abandon_board':
-                rendered_html : str = render_to_string("bingo/partials/confirm_abandon_board_modal.html")
+                rendered_html : str = await arender_to_string("bingo/partials/confirm_abandon_board_modal.html")
                 await self.send(rendered_html)
             elif message_type == 'abandon_board':
                 message = f"{player.name} is giving up on their board and starting over"
@@ -174,10 +271,12 @@ class BingoGameConsumer(AsyncWebsocketConsumer):
                    'title': 'Change Name',
                    'submit_text': 'Change Name', 
                 }
-                rendered_html : str = render_to_string("bingo/partials/modal.html", context)
+                rendered_html : str = await arender_to_string("bingo/partials/modal.html", context)
                 await self.send(rendered_html)
             elif message_type == 'change_name':
                 player_name = await self.process_name_change(data)
+                await presence.rename(self.session.game.code, self.player_id, player_name)
+                await self.invalidate_own_sessions()
                 rendered_html : str = f'<div hx-target="#player-info" hx-swap="outerHTML" id="player-info" class="player-info">Playing as: <strong>{player_name}</strong></div>'
                 await self.close_sidebar()
                 await self.send(rendered_html)
@@ -185,7 +284,7 @@ class BingoGameConsumer(AsyncWebsocketConsumer):
                 await self.feedback_form()
             elif message_type == 'submit_feedback':
                 await self.process_feedback(data)
-                rendered_html = render_to_string("bingo/partials/feedback_accepted.html")
+                rendered_html = await arender_to_string("bingo/partials/feedback_accepted.html")
                 await self.close_sidebar()
                 await self.send(rendered_html)
 
@@ -207,17 +306,25 @@ class BingoGameConsumer(AsyncWebsocketConsumer):
             'winner': event['winner']
         }))
 
+    async def session_invalidate(self, event):
+        player_id = event.get('player_id')
+        if event.get('sender') == self.channel_name:
+            return
+        if player_id is None or player_id == self.player_id:
+            await self.refresh_session()
+
     async def player_event(self, event):
-        player : Player = await self.get_player()
-        game_event = event['game_event']
-        game_event['remove_in'] = 90
-        game_event['class'] = ''
-        if "BINGO" in game_event['message']:
-            game_event['class'] = 'winning-message'
-        event_html : str = render_to_string("bingo/partials/event_item.html", context={'event': game_event})
-        rendered_html = f'<div hx-swap-oob="afterbegin:#events-list">{event_html}</div>'
+        player : Player = self.session.player
+        if event.get('player_id') == self.player_id and event.get("sender") != self.channel_name:
+            # Our player acted from another tab, so our copy of the board is stale
+            await self.refresh_session()
         if event.get("sender") != self.channel_name or player.show_own_events: 
-            await self.send(rendered_html)
+            await self.send(event['delta'] if self.delta else event['html'])
+
+    async def player_events(self, event):
+        # One window's worth of coalesced events
+        for game_event in event['events']:
+            await self.player_event(game_event)
 
     async def clear_modal(self):
         empty_modal = '<div id="theModal" hx-target="#theModal" hx-swap="outerHTML"></div>'
@@ -227,26 +334,38 @@ class BingoGameConsumer(AsyncWebsocketConsumer):
         close_script = f'<div id="immediateScript" hx-target="#immediateScript" hx-swap="outerHTML"><script>{javascript}</script></div>'
         await self.send(close_script)
 
+    async def throttle(self, message_type, retry_after):
+        """Drop a message over the rate limit, telling the client once per stretch"""
+        now = time.monotonic()
+        if now < self.throttled_until:
+            return
+        # Buckets refill in fractions of a second; don't notify that often
+        retry_after = max(retry_after, THROTTLE_NOTICE_INTERVAL)
+        self.throttled_until = now + retry_after
+        if self.delta:
+            await self.send(protocol.throttled(message_type, retry_after))
+        else:
+            await self.send('<div id="errorMessage" class="error-message">Slow down a little! Some of your taps were ignored.</div>')
+
+    async def clear_throttle(self):
+        self.throttled_until = 0
+        if not self.delta:
+            await self.send('<div id="errorMessage" class="error-message" style="display: none;"></div>')
+
     async def close_sidebar(self):
         await self.do_javascript('document.getElementById("sidebar").classList.remove("show");')
 
     async def start_new_game(self) -> Player:
         player : Player = await self.clear_board()
-        context = { 
-            'player': player,
-            'game': player.game,
-            'board_items': player.board_layout,
-            'board_positions': range(player.game.board_size * player.game.board_size),
-        }
-        rendered_html = render_to_string("bingo/partials/bingo_board.html", context=context)
-        await self.send(rendered_html)
+        await self.invalidate_own_sessions()
+        await self.send(self.render_board())
         await self.clear_modal()
         await self.close_sidebar()
         return player
     
 
     async def feedback_form(self):
-        player = await self.get_player()
+        player = self.session.player
         if player:
             context = {
                 'player': player,
@@ -257,100 +376,165 @@ class BingoGameConsumer(AsyncWebsocketConsumer):
             context = {
                 'form': FeedbackForm()
             }
-        rendered_html = render_to_string("bingo/partials/feedback_form.html", context=context)
+        rendered_html = await arender_to_string("bingo/partials/feedback_form.html", context=context)
         await self.send(rendered_html)
     
-    @database_sync_to_async
-    def create_event(self, player, message):
-        game_event = {
-            'player': player.name,
-            'message': message,
-            'created_at': timezone.now().timestamp()*1000,
-        }
-        if not getattr(settings, 'FORGET_GAME_EVENTS', False):
-            game_event_object = GameEvent.objects.create(
-                game=player.game,
-                player=player,
-                message=message
-            )
-
-        async_to_sync(self.channel_layer.group_send)(
-            self.game_group_name,
-            {
-                'type': 'player_event',
-                'game_event': game_event,
-                'sender': self.channel_name,
-            }
+    async def create_event(self, player, message):
+        if coalescer.enabled:
+            # Goes out together with any marks still being held
+            await coalescer.event(self.session.game.code, player, self.channel_name, message)
+            return
+        await groups.group_send(
+            self.session.game.code,
+            await build_player_event(self.session.game.code, player, message, self.channel_name),
+            channel_layer=self.channel_layer,
         )
 
-    @database_sync_to_async
-    def get_player(self):
+    async def load_session(self):
         try:
-            player: Player = Player.objects.select_related('game').get(id=self.player_id)
-            # logger.info(f"Found player: {player.name} for game: {player.game.code}")
-            return player
-        except Player.DoesNotExist:
-            logger.error(f"Player {self.player_id} not found")
-            return None
+            return await PlayerSession.load(self.player_id)
         except Exception as e:
             logger.exception(f"Error getting player {self.player_id}")
             return None
 
-    @database_sync_to_async
-    def update_player_connection_status(self, is_connected):
-        Player.objects.filter(id=self.player_id).update(is_connected=is_connected)
+    async def refresh_session(self):
+        await self.session.reload()
+
+    async def invalidate_own_sessions(self):
+        """Tell this player's other open tabs to reload their session"""
+        await groups.group_send(
+            self.session.game.code,
+            {
+                'type': 'session_invalidate',
+                'player_id': self.player_id,
+                'sender': self.channel_name,
+            },
+            spectators=False,
+            channel_layer=self.channel_layer,
+        )
+
+    async def heartbeat(self):
+        """Keep this connection's presence entry from expiring"""
+        while True:
+            await asyncio.sleep(presence.heartbeat_interval)
+            try:
+                await presence.heartbeat(self.session.game.code, self.player_id, self.channel_name)
+            except Exception:
+                logger.exception(f"Presence heartbeat failed for player {self.player_id}")
     
-    @database_sync_to_async
-    def clear_board(self) -> Player:
-        player : Player = Player.objects.select_related('game').get(id=self.player_id)
-        game : BingoGame = player.game
-        player.board_layout = game.generate_board_layout()
+    async def clear_board(self) -> Player:
+        player : Player = self.session.player
+        game : BingoGame = self.session.game
+        player.layout = await game.agenerate_board_layout()
         player.covered_positions = []
         if game.has_free_square and game.get_center_position():
             player.covered_positions = [ game.get_center_position() ]
-            player.board_layout[game.get_center_position()] = "FREE"
         player.has_won = False
-        player.save()
+        # This save supersedes anything still waiting in the write-behind buffer
+        coverage_buffer.discard(player.id)
+        await player.asave(update_fields=[
+            'layout_snapshot', 'layout_seed', 'board_item_ids', 'covered_mask', 'has_won', 'last_seen',
+        ])
+        await self.session.reset_board()
+        await replay.append_cell(game.code, player.id, BOARD)
         return player
 
-    @database_sync_to_async
-    def mark_position(self, position):
-        player = Player.objects.get(id=self.player_id)
-        game = player.game
+    async def mark_position(self, position):
+        player = self.session.player
+        game = self.session.game
+        # A square's index, as a number or a string of digits
+        if isinstance(position, bool) or not str(position).isascii() or not str(position).isdecimal():
+            logger.warning(f"Player {self.player_id} sent invalid position {position!r}")
+            return False
         position = int(position)
+        if not 0 <= position < game.board_size ** 2:
+            logger.warning(f"Player {self.player_id} sent position {position} off the board")
+            return False
         
         if not game.is_active or player.has_won:
             return False
             
-        if position not in player.covered_positions:
+        if self.session.toggle(position):
             action = "marked"
-            player.covered_positions.append(position)
-            player.save()
         else:
             action = "unmarked"
-            player.covered_positions.remove(position)
-            player.save()
-        
-        cell = {
-            'position': position,
-            'covered': position in player.covered_positions,
-            'text': player.board_layout[position],
-            'free': (position == 12 and game.has_free_square and game.size == 5),
-        }
+        if coverage_buffer.enabled:
+            coverage_buffer.add(player)
+        else:
+            await player.asave(update_fields=['covered_mask', 'last_seen'])
+        await replay.append_cell(game.code, player.id, position)
+        rendered = self.render_cell(position)
 
         # Create event
-        async_to_sync(self.create_event)(
-            player=player,
-            message=f"{player.name} {action} '{player.board_layout[position]}'"
+        if coalescer.enabled:
+            coalescer.mark(game.code, player, self.channel_name, position,
+                           self.session.text(position), self.session.is_covered(position))
+        else:
+            await self.create_event(
+                player=player,
+                message=f"{player.name} {action} '{self.session.text(position)}'"
+            )
+
+        return rendered
+
+    def render_cell(self, position) -> str:
+        player = self.session.player
+        game = self.session.game
+        if self.delta:
+            return protocol.mark(position, self.session.is_covered(position))
+        return fragments.render_cell(
+            position=position,
+            text=self.session.text(position),
+            covered=self.session.is_covered(position),
+            free=(position == 12 and game.has_free_square and game.board_size == 5),
         )
 
-        rendered_html = render_to_string('bingo/partials/bingo_cell.html', cell) 
-        return rendered_html  
+    def render_board(self) -> str:
+        if self.delta:
+            return protocol.board(self.session.player, self.session.game, self.session.texts)
+        return fragments.render_board(self.session.player, self.session.game, self.session.texts)
+
+    async def resume(self, last_seq):
+        """Catch a reconnecting client up, sending everything only if its gap is too old"""
+        game = self.session.game
+        player = self.session.player
+        missed = await replay.since(game.code, self.player_id, last_seq)
+        if missed is None:
+            await self.send_full_state()
+            return
+        if missed.board:
+            await self.send(self.render_board())
+        else:
+            for position in missed.positions:
+                await self.send(self.render_cell(position))
+        now = time.time() * 1000
+        for game_event in missed.events:
+            if game_event['player_id'] == self.player_id and not player.show_own_events:
+                continue
+            # Keep each event on screen only for what is left of its lifetime
+            remove_in = round(PLAYER_EVENT_LIFETIME - (now - game_event['created_at']) / 1000, 1)
+            if remove_in <= 0:
+                continue
+            if self.delta:
+                await self.send(protocol.event(game_event, remove_in=remove_in))
+            else:
+                await self.send(render_event(game_event, remove_in=remove_in))
 
-    @database_sync_to_async
-    def get_game_state(self):
-        player = Player.objects.get(id=self.player_id)
-        game = player.game
+    async def send_full_state(self):
+        """The board, recent events and game state, replacing whatever the client has"""
+        await self.send(self.render_board())
+        if not self.delta:
+            _, events = await timeline.alatest_events(self.session.game)
+            items = ''.join(fragments.render_event(event) for event in events)
+            await self.send(f'<div id="events-list" class="events-list">{items}</div>')
+        await self.send_game_state()
+
+    async def get_game_state(self):
+        player = self.session.player
+        game = self.session.game
+        # Read first, so anything after this point is replayed on the next reconnect
+        seq = await replay.current(game.code)
+        connected = await presence.connected(game.code)
         
         return {
             'type': 'game_state',
@@ -358,28 +542,29 @@ class BingoGameConsumer(AsyncWebsocketConsumer):
             'has_won': player.has_won,
             'winner': game.winner.name if game.winner else None,
             'covered_positions': player.covered_positions,
-            'connected_players': list(game.players.filter(
-                is_connected=True).values_list('name', flat=True))
+            'connected_players': list(connected.values()),
+            'seq': seq,
         }
 
     async def send_game_state(self):
         state = await self.get_game_state()
-        await self.send(text_data=json.dumps(state))
+        if self.delta:
+            await self.send(protocol.state(state))
+        else:
+            await self.send(text_data=json.dumps(state))
 
     async def check_win_condition(self):
-        player = await self.get_player()
-        game = player.game
-        return game.check_win_condition(player.covered_positions)
+        return self.session.has_won
     
-    @database_sync_to_async
-    def process_feedback(self, data):
+    async def process_feedback(self, data):
         form = FeedbackForm(data)
+        feedback = None
         if form.is_valid():
-            feedback = form.save(commit=True)
+            feedback = form.save(commit=False)
+            await feedback.asave()
         return feedback
     
-    @database_sync_to_async
-    def process_suggestions(self, data):
+    async def process_suggestions(self, data):
         form = SuggestionForm(data)
         if form.is_valid():
             suggestions = [
@@ -390,29 +575,27 @@ class BingoGameConsumer(AsyncWebsocketConsumer):
             suggestions = [s.lower() for s in suggestions if s.strip() != '']
             if not suggestions:
                 return
-            player = Player.objects.get(id=self.player_id)
-            game = player.game
-            board = game.board
+            player = self.session.player
+            board_id = self.session.game.board_id
             # Implement some check for duplication here
             for suggestion in suggestions:
-                if board.items.filter(text=suggestion):
+                if await BingoBoardItem.objects.filter(board_id=board_id, text=suggestion).aexists():
                     continue
-                BingoBoardItem.objects.create(
-                    board=board,
+                await BingoBoardItem.objects.acreate(
+                    board_id=board_id,
                     text=suggestion,
                     suggested_by=player.name,
                 )
 
 
-    @database_sync_to_async
-    def process_name_change(self, data):
+    async def process_name_change(self, data):
         form = PlayerNameChangeForm(data)
         if form.is_valid():
             new_name = form.cleaned_data['nickname']
-            player = Player.objects.get(id=self.player_id)
+            player = self.session.player
             if player.name != new_name:
                 player.name = new_name
-                player.save()
+                await player.asave(update_fields=['name', 'last_seen'])
             return player.name
             
 
@@ -0,0 +1,93 @@
+# bingo/eventsink.py
+import atexit
+import logging
+import threading
+from collections import deque
+from django.conf import settings
+from django.db import close_old_connections
+from channels.db import database_sync_to_async
+from .background import BackgroundTask
+from .models import GameEvent
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'ENABLED': True,
+    'BATCH_SIZE': 200,       # flush as soon as this many events are queued
+    'FLUSH_INTERVAL': 0.5,   # otherwise flush this often, in seconds
+}
+
+
+class EventSink(BackgroundTask):
+    """Queue of unsaved GameEvents persisted in batches with ``bulk_create``.
+
+    Events are written in the order they were queued, so each game's history
+    keeps its order. Consumers queue the event and broadcast immediately;
+    the INSERT happens later on the background flusher.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._queue = deque()
+        self._flush_lock = threading.Lock()
+
+    def _config(self, key):
+        return getattr(settings, 'GAME_EVENT_SINK', {}).get(key, DEFAULTS[key])
+
+    @property
+    def enabled(self) -> bool:
+        return self._config('ENABLED')
+
+    def add(self, event: GameEvent):
+        """Queue an unsaved event. Safe to call from any thread."""
+        self._queue.append(event)
+        if len(self._queue) >= self._config('BATCH_SIZE'):
+            self.wake()
+
+    def flush(self) -> int:
+        """Write every queued event. Must run off the event loop."""
+        # One flush at a time, otherwise two batches could land out of order
+        with self._flush_lock:
+            batch = []
+            while self._queue:
+                batch.append(self._queue.popleft())
+            if not batch:
+                return 0
+            try:
+                GameEvent.objects.bulk_create(batch)
+            except Exception:
+                # Most likely one event's player or game was deleted; save the
+                # rest one by one so a single bad row can't wedge the queue
+                logger.exception(f"Bulk insert of {len(batch)} game events failed, retrying singly")
+                saved = 0
+                for event in batch:
+                    try:
+                        event.save()
+                        saved += 1
+                    except Exception:
+                        logger.exception(f"Dropping game event {event.message!r}")
+                return saved
+            return len(batch)
+
+    async def _run(self):
+        while True:
+            await self.wait(self._config('FLUSH_INTERVAL'))
+            if not self._queue:
+                continue
+            try:
+                count = await database_sync_to_async(self.flush)()
+                logger.debug(f"Saved {count} game events")
+            except Exception:
+                logger.exception("Error saving queued game events")
+
+    def shutdown(self):
+        try:
+            self.flush()
+        except Exception:
+            logger.exception("Error saving queued game events on shutdown")
+        finally:
+            close_old_connections()
+
+
+event_sink = EventSink()
+atexit.register(event_sink.shutdown)
@@ -0,0 +1,240 @@
+# bingo/fragments.py
+"""Fast renderers for the fragments the consumers send on almost every message.
+
+Each template is compiled once: it is rendered with marker values, and the
+output is split at the markers into a ``str.format`` pattern. Each slot
+remembers whether the template escaped it. Rendering is then one format
+call and gives exactly the bytes ``render_to_string`` would. If a template
+changes so that a pattern no longer matches it, that fragment falls back to
+the template engine and a warning is logged.
+"""
+import html
+import logging
+from types import SimpleNamespace
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.template.loader import render_to_string
+from django.utils.formats import localize
+from django.utils.html import conditional_escape, escape
+
+logger = logging.getLogger(__name__)
+
+CELL_TEMPLATE = 'bingo/partials/bingo_cell.html'
+BOARD_TEMPLATE = 'bingo/partials/bingo_board.html'
+EVENT_TEMPLATE = 'bingo/partials/event_item.html'
+
+
+def _marker(name):
+    # The '<' tells us whether the template escaped the value
+    return f'\x00{name}<\x00'
+
+
+class Pattern:
+    """A compiled template: a format string plus how each slot is printed"""
+    __slots__ = ('format_string', 'escaped', 'raw')
+
+    def __init__(self, html, names):
+        pattern = html.replace('{', '{{').replace('}', '}}')
+        self.escaped, self.raw = [], []
+        for name in names:
+            if escape(_marker(name)) in pattern:
+                pattern = pattern.replace(escape(_marker(name)), '{%s}' % name)
+                self.escaped.append(name)
+            if _marker(name) in pattern:
+                pattern = pattern.replace(_marker(name), '{%s_raw}' % name)
+                self.raw.append(name)
+        if '\x00' in pattern:
+            raise ValueError('a marker was transformed by the template')
+        self.format_string = pattern
+
+    def format(self, **values):
+        slots = {}
+        for name in self.escaped:
+            slots[name] = _escaped(values[name])
+        for name in self.raw:
+            slots[f'{name}_raw'] = _display(values[name])
+        return self.format_string.format(**slots)
+
+
+def _display(value):
+    """What ``{{ value }}`` prints before escaping"""
+    if isinstance(value, str):
+        return value
+    if type(value) is int and not settings.USE_THOUSAND_SEPARATOR:
+        # All localize() would do for a plain int
+        return str(value)
+    return str(localize(value))
+
+
+def _escaped(value):
+    """What ``{{ value }}`` prints with autoescaping on"""
+    if hasattr(value, '__html__'):
+        return conditional_escape(value)
+    # django.utils.html.escape without the lazy-string wrapper
+    return html.escape(_display(value))
+
+
+def _is_free(position, game):
+    return game.has_free_square and game.board_size == 5 and position == 12
+
+
+class FragmentRenderer:
+    def __init__(self):
+        self._cell = None
+        self._board = None
+        self._event = None
+        self.compiled = False
+
+    def compile(self):
+        """Build the patterns. Cheap, but it does hit the template engine."""
+        self._cell = self._board = self._event = None
+        try:
+            self._cell = self._compile_cell()
+        except Exception:
+            logger.warning(f"Falling back to the template engine for {CELL_TEMPLATE}", exc_info=True)
+        try:
+            self._board = self._compile_board()
+        except Exception:
+            logger.warning(f"Falling back to the template engine for {BOARD_TEMPLATE}", exc_info=True)
+        try:
+            self._event = self._compile_event()
+        except Exception:
+            logger.warning(f"Falling back to the template engine for {EVENT_TEMPLATE}", exc_info=True)
+        self.compiled = True
+
+    def _ensure_compiled(self):
+        if not self.compiled:
+            self.compile()
+
+    # Cells
+
+    def _compile_cell(self):
+        variants = {}
+        for covered in (False, True):
+            for free in (False, True):
+                html = render_to_string(CELL_TEMPLATE, {
+                    'position': _marker('position'),
+                    'text': _marker('text'),
+                    'covered': covered,
+                    'free': free,
+                })
+                variants[covered, free] = Pattern(html, ['position', 'text'])
+        self._verify_cell(variants)
+        return variants
+
+    def _format_cell(self, variants, position, text, covered, free):
+        return variants[bool(covered), bool(free)].format(position=position, text=text)
+
+    def _verify_cell(self, variants):
+        for covered in (False, True):
+            for free in (False, True):
+                context = {'position': 7, 'text': 'Tom & "Jerry" <3', 'covered': covered, 'free': free}
+                if self._format_cell(variants, **context) != render_to_string(CELL_TEMPLATE, context):
+                    raise ValueError(f'compiled {CELL_TEMPLATE} does not match the template')
+
+    def render_cell(self, position, text, covered, free) -> str:
+        """Same output as rendering bingo_cell.html"""
+        self._ensure_compiled()
+        if self._cell is None:
+            return render_to_string(CELL_TEMPLATE, {
+                'position': position, 'text': text, 'covered': covered, 'free': free,
+            })
+        return self._format_cell(self._cell, position, text, covered, free)
+
+    # Boards
+
+    def _compile_board(self):
+        if self._cell is None:
+            raise ValueError('board rendering needs the compiled cell')
+        game = SimpleNamespace(board_size=_marker('size'), has_free_square=False)
+        player = SimpleNamespace(id=0, covered_positions=[])
+        texts = [_marker('first'), _marker('second')]
+        html = render_to_string(BOARD_TEMPLATE, {
+            'player': player, 'game': game, 'board_items': texts, 'board_positions': range(2),
+        })
+        empty = render_to_string(BOARD_TEMPLATE, {
+            'player': player, 'game': game, 'board_items': [], 'board_positions': range(0),
+        })
+        cells = [self._format_cell(self._cell, position, text, False, False) for position, text in enumerate(texts)]
+        first = html.index(cells[0])
+        second = html.index(cells[1], first + len(cells[0]))
+        board = {
+            'empty': Pattern(empty, ['size']),
+            'head': Pattern(html[:first], ['size']),
+            'between': Pattern(html[first + len(cells[0]):second], ['size']),
+            'tail': Pattern(html[second + len(cells[1]):], ['size']),
+        }
+        self._verify_board(board)
+        return board
+
+    def _format_board(self, board, player, game, board_items):
+        size = game.board_size
+        covered = set(player.covered_positions)
+        cells = [
+            self._format_cell(self._cell, position, text, position in covered, _is_free(position, game))
+            for position, text in zip(range(size * size), board_items)
+        ]
+        if not cells:
+            return board['empty'].format(size=size)
+        return (
+            board['head'].format(size=size)
+            + board['between'].format(size=size).join(cells)
+            + board['tail'].format(size=size)
+        )
+
+    def _verify_board(self, board):
+        game = SimpleNamespace(board_size=5, has_free_square=True)
+        player = SimpleNamespace(id=1, covered_positions=[0, 12, 24])
+        items = [f'Square <{i}>' for i in range(25)]
+        expected = render_to_string(BOARD_TEMPLATE, {
+            'player': player, 'game': game, 'board_items': items, 'board_positions': range(25),
+        })
+        if self._format_board(board, player, game, items) != expected:
+            raise ValueError(f'compiled {BOARD_TEMPLATE} does not match the template')
+
+    def render_board(self, player, game, board_items=None) -> str:
+        """Same output as rendering bingo_board.html, in one pass"""
+        self._ensure_compiled()
+        if board_items is None:
+            board_items = player.board_layout
+        if self._board is None:
+            return render_to_string(BOARD_TEMPLATE, {
+                'player': player,
+                'game': game,
+                'board_items': board_items,
+                'board_positions': range(game.board_size * game.board_size),
+            })
+        return self._format_board(self._board, player, game, board_items)
+
+    # Events
+
+    def _compile_event(self):
+        names = ['class', 'remove_in', 'created_at', 'seq', 'message']
+        html = render_to_string(EVENT_TEMPLATE, {'event': {name: _marker(name) for name in names}})
+        pattern = Pattern(html, names)
+        sample = {'class': 'winning-message', 'remove_in': 12.5, 'created_at': 1760790000123.4567,
+                  'seq': 42, 'message': "Jo <b>marked</b> 'A & B'"}
+        if pattern.format(**sample) != render_to_string(EVENT_TEMPLATE, {'event': sample}):
+            raise ValueError(f'compiled {EVENT_TEMPLATE} does not match the template')
+        return pattern
+
+    def render_event(self, event: dict) -> str:
+        """Same output as rendering event_item.html for one event"""
+        self._ensure_compiled()
+        if self._event is None:
+            return render_to_string(EVENT_TEMPLATE, {'event': event})
+        return self._event.format(**{
+            'class': event.get('class', ''),
+            'remove_in': event.get('remove_in', ''),
+            'created_at': event.get('created_at', ''),
+            'seq': event.get('seq', ''),
+            'message': event.get('message', ''),
+        })
+
+
+fragments = FragmentRenderer()
+
+
+async def arender_to_string(template_name, context=None) -> str:
+    """render_to_string on a worker thread, for templates without a fast path"""
+    return await sync_to_async(render_to_string, thread_sensitive=False)(template_name, context)
@@ -0,0 +1,165 @@
+# bingo/gamecodes.py
+"""Allocating game codes from a pool of free ones.
+
+Free codes are rows of GameCode, each with a random rank, so taking the
+lowest rank is one index lookup and still hands out codes in no guessable
+order. A code belongs to whichever worker deletes its row, which makes
+allocation race-free on any database. Where the database can skip locked
+rows, concurrent workers don't even wait for each other.
+
+When the pool runs low it is refilled. It first takes back the codes of
+games that ended long enough ago, then adds unused codes of the shortest
+length that is not yet mostly taken. The codes grow a letter longer when
+the short ones run out.
+"""
+import itertools
+import logging
+import random
+from datetime import timedelta
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Count
+from django.db.models.functions import Length
+from django.utils import timezone
+from .models import BingoGame, GameCode
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'ALPHABET': 'ABCDEFGHJKLMNPQRSTUVWXYZ',
+    'MIN_LENGTH': 3,
+    'LOW_WATER': 200,                # refill when fewer free codes are left
+    'REFILL': 2000,                  # codes added per refill
+    'MAX_FILL': 0.75,                # share of a length's codes in use before moving to the next length
+    'RECYCLE_AFTER': 30 * 24 * 3600, # seconds after a game ends before its code is reused
+}
+
+# BingoGame.code's max_length
+MAX_LENGTH = 6
+
+# Up to this many codes of one length are listed outright instead of drawn at random
+ENUMERATE_LIMIT = 100_000
+
+# Pops lost to other workers before giving up
+MAX_ATTEMPTS = 20
+
+
+class CodesExhausted(Exception):
+    """Every code up to MAX_LENGTH letters is in use"""
+
+
+def _config(key):
+    return getattr(settings, 'GAME_CODES', {}).get(key, DEFAULTS[key])
+
+
+def _rank():
+    return random.getrandbits(31)
+
+
+def _pop():
+    """Take the next free code. None if the pool is empty, '' if another worker took it first."""
+    with transaction.atomic():
+        candidates = GameCode.objects.order_by('rank')
+        if connection.features.has_select_for_update_skip_locked:
+            candidates = candidates.select_for_update(skip_locked=True)
+        code = candidates.values_list('code', flat=True).first()
+        if code is None:
+            return None
+        deleted, _ = GameCode.objects.filter(code=code).delete()
+    return code if deleted else ''
+
+
+def _running_low() -> bool:
+    low_water = _config('LOW_WATER')
+    return not GameCode.objects.order_by('rank')[low_water - 1:low_water].exists()
+
+
+def allocate() -> str:
+    """A code no game is using, removed from the pool"""
+    for _ in range(MAX_ATTEMPTS):
+        code = _pop()
+        if code is None:
+            if not refill():
+                raise CodesExhausted(f'No free game codes up to {MAX_LENGTH} letters')
+            continue
+        if code:
+            if _running_low():
+                refill()
+            return code
+    raise CodesExhausted('Gave up after losing every attempt to other workers')
+
+
+def recycle(now=None) -> int:
+    """Return the codes of games that ended more than RECYCLE_AFTER ago to the pool"""
+    now = now or timezone.now()
+    cutoff = now - timedelta(seconds=_config('RECYCLE_AFTER'))
+    ended = BingoGame.objects.filter(is_active=False, ended_at__lte=cutoff, code__isnull=False)
+    games = list(ended.values_list('id', 'code')[:_config('REFILL')])
+    if not games:
+        return 0
+    with transaction.atomic():
+        # The old game keeps its players and events, but can no longer be reached by code
+        BingoGame.objects.filter(id__in=[game_id for game_id, _ in games]).update(code=None)
+        GameCode.objects.bulk_create(
+            [GameCode(code=code, rank=_rank()) for _, code in games], ignore_conflicts=True,
+        )
+    logger.info(f"Recycled {len(games)} game codes")
+    return len(games)
+
+
+def _taken(codes):
+    """Which of these codes are already in the pool or on a game"""
+    codes = list(codes)
+    taken = set()
+    for start in range(0, len(codes), 500):
+        chunk = codes[start:start + 500]
+        # Read the pool first: a code popped in between is then on a game by the time we look
+        taken.update(GameCode.objects.filter(code__in=chunk).values_list('code', flat=True))
+        taken.update(BingoGame.objects.filter(code__in=chunk).values_list('code', flat=True))
+    return taken
+
+
+def _fill(length, wanted) -> int:
+    alphabet = _config('ALPHABET')
+    space = len(alphabet) ** length
+    in_use = (
+        GameCode.objects.annotate(length=Length('code')).filter(length=length).count()
+        + BingoGame.objects.annotate(length=Length('code')).filter(length=length).count()
+    )
+    if in_use >= space * _config('MAX_FILL'):
+        return 0
+    if space <= ENUMERATE_LIMIT:
+        candidates = [''.join(letters) for letters in itertools.product(alphabet, repeat=length)]
+        random.shuffle(candidates)
+    else:
+        # At most MAX_FILL of the space is taken, so twice the draws nearly always suffice
+        candidates = {''.join(random.choices(alphabet, k=length)) for _ in range(wanted * 2)}
+    taken = _taken(candidates)
+    codes = [code for code in candidates if code not in taken][:wanted]
+    GameCode.objects.bulk_create([GameCode(code=code, rank=_rank()) for code in codes], ignore_conflicts=True)
+    return len(codes)
+
+
+def refill() -> int:
+    """Top the pool up, recycling first and widening codes if needed. Returns codes added."""
+    wanted = _config('REFILL')
+    added = recycle()
+    for length in range(_config('MIN_LENGTH'), MAX_LENGTH + 1):
+        if added >= wanted:
+            break
+        added += _fill(length, wanted - added)
+    if added:
+        logger.info(f"Added {added} codes to the game code pool")
+    return added
+
+
+def input_pattern() -> str:
+    """An HTML pattern for the join form that accepts every length of code handed out"""
+    # Digits too, for codes from before the pool
+    return f"[A-Za-z0-9]{{{_config('MIN_LENGTH')},{MAX_LENGTH}}}"
+
+
+def stats() -> dict:
+    """Free codes by length"""
+    rows = GameCode.objects.annotate(length=Length('code')).values('length').annotate(free=Count('code'))
+    return {row['length']: row['free'] for row in rows.order_by('length')}
@@ -0,0 +1,60 @@
+# bingo/groups.py
+"""Channel-layer groups for a game, split into shards.
+
+A consumer joins one shard group when it connects: players go into
+``game_<code>_p<n>`` and spectators into ``game_<code>_s<n>``. The shard
+comes from a hash of the channel name. Broadcasting publishes once per
+shard. Player shards are sent together first; spectator shards follow, so
+a large audience never delays the people playing.
+
+Keeping groups small matters with channels_redis, where a group_send
+touches every member of the group in one call.
+"""
+import asyncio
+import zlib
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.conf import settings
+
+DEFAULTS = {
+    'PLAYER_SHARDS': 1,
+    'SPECTATOR_SHARDS': 1,
+}
+
+
+def _config(key):
+    return getattr(settings, 'GAME_GROUPS', {}).get(key, DEFAULTS[key])
+
+
+def _shard(channel_name, shards):
+    return zlib.crc32(channel_name.encode()) % shards
+
+
+def player_groups(game_code) -> list:
+    return [f'game_{game_code}_p{shard}' for shard in range(_config('PLAYER_SHARDS'))]
+
+
+def spectator_groups(game_code) -> list:
+    return [f'game_{game_code}_s{shard}' for shard in range(_config('SPECTATOR_SHARDS'))]
+
+
+def player_group(game_code, channel_name) -> str:
+    """The shard group a player's connection belongs in"""
+    return f'game_{game_code}_p{_shard(channel_name, _config("PLAYER_SHARDS"))}'
+
+
+def spectator_group(game_code, channel_name) -> str:
+    return f'game_{game_code}_s{_shard(channel_name, _config("SPECTATOR_SHARDS"))}'
+
+
+async def group_send(game_code, message, spectators=True, channel_layer=None):
+    """Send a message to every shard of a game, players before spectators"""
+    channel_layer = channel_layer or get_channel_layer()
+    await asyncio.gather(*(channel_layer.group_send(group, message) for group in player_groups(game_code)))
+    if spectators:
+        await asyncio.gather(*(channel_layer.group_send(group, message) for group in spectator_groups(game_code)))
+
+
+def group_send_sync(game_code, message, spectators=True):
+    """group_send for code outside the event loop, like admin views"""
+    async_to_sync(group_send)(game_code, message, spectators)
@@ -0,0 +1,91 @@
+# bingo/itemtable.py
+"""Per-board tables of item texts.
+
+Players store their board as a list of BingoBoardItem ids rather than the
+texts themselves, so thousands of players on one board don't each carry a
+copy of every string. The texts are looked up here. A board's table is
+loaded with one query and kept until it is too old, until a player needs
+an id it doesn't know yet (a newly approved suggestion), or until an item
+of that board is saved or deleted in this process.
+"""
+import threading
+import time
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from .models import BingoBoardItem, FREE_SQUARE
+
+FREE_TEXT = 'FREE'
+
+# Seconds a table is trusted; edits made in other processes show up after this
+TABLE_TTL = 300
+
+
+class ItemTable:
+    """The texts of one board's items, by id"""
+    __slots__ = ('board_id', 'texts_by_id', 'loaded_at')
+
+    def __init__(self, board_id, texts_by_id):
+        self.board_id = board_id
+        self.texts_by_id = texts_by_id
+        self.loaded_at = time.monotonic()
+
+    def covers(self, item_ids) -> bool:
+        return all(item_id == FREE_SQUARE or item_id in self.texts_by_id for item_id in item_ids)
+
+    def text(self, item_id) -> str:
+        if item_id == FREE_SQUARE:
+            return FREE_TEXT
+        # A deleted item leaves an empty square rather than breaking the board
+        return self.texts_by_id.get(item_id, '')
+
+    def texts(self, item_ids) -> list:
+        return [self.text(item_id) for item_id in item_ids]
+
+
+class ItemTables:
+    """Process-wide cache of ItemTables"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._tables = {}   # board id -> ItemTable
+
+    def _cached(self, board_id, item_ids):
+        with self._lock:
+            table = self._tables.get(board_id)
+        if table is None or time.monotonic() - table.loaded_at > TABLE_TTL or not table.covers(item_ids):
+            return None
+        return table
+
+    def _store(self, board_id, rows):
+        table = ItemTable(board_id, dict(rows))
+        with self._lock:
+            self._tables[board_id] = table
+        return table
+
+    def get(self, board_id, item_ids=()) -> ItemTable:
+        """The board's table, reloaded if it is stale or missing any of ``item_ids``"""
+        table = self._cached(board_id, item_ids)
+        if table is None:
+            table = self._store(board_id, BingoBoardItem.objects.filter(board_id=board_id).values_list('id', 'text'))
+        return table
+
+    async def aget(self, board_id, item_ids=()) -> ItemTable:
+        """Async version of get for consumers"""
+        table = self._cached(board_id, item_ids)
+        if table is None:
+            rows = [row async for row in BingoBoardItem.objects.filter(board_id=board_id).values_list('id', 'text')]
+            table = self._store(board_id, rows)
+        return table
+
+    def invalidate(self, board_id):
+        with self._lock:
+            self._tables.pop(board_id, None)
+
+
+item_tables = ItemTables()
+
+
+@receiver(post_save, sender=BingoBoardItem)
+@receiver(post_delete, sender=BingoBoardItem)
+def _item_changed(sender, instance, **kwargs):
+    item_tables.invalidate(instance.board_id)
@@ -0,0 +1,243 @@
+# bingo/layers.py
+"""A channel layer that keeps same-process traffic off Redis.
+
+Channels created by this process are plain in-memory queues. Group
+membership is tracked twice: locally as the set of this process's member
+channels, and in Redis as the set of *nodes* (processes) that have any
+member. Sending to a group means:
+
+* putting the message straight onto the local members' queues, and
+* one Redis group_send of an envelope to the group's nodes. Each node
+  unpacks it for its own members. Our own copy comes back too, and we
+  drop it.
+
+So Redis work per broadcast grows with the number of processes, not the
+number of members. Without ``hosts`` in CONFIG there is no Redis at all and
+the layer works as a single-node in-memory layer.
+
+Local delivery does not copy messages. Every member gets the same dict,
+so consumers must treat messages as read-only, which ours already do.
+Channels have to join and leave groups from the process that created them.
+
+    CHANNEL_LAYERS = {
+        'default': {
+            'BACKEND': 'bingo.layers.HybridChannelLayer',
+            'CONFIG': {'hosts': [('127.0.0.1', 6379)]},
+        },
+    }
+"""
+import asyncio
+import logging
+import random
+import string
+import time
+import uuid
+from channels.exceptions import ChannelFull
+from channels.layers import BaseChannelLayer
+
+logger = logging.getLogger(__name__)
+
+LOCAL_PREFIX = 'hybrid.'
+NODE_PREFIX = 'hybrid-node.'
+
+
+def _random_name(length=12):
+    return ''.join(random.choice(string.ascii_letters) for _ in range(length))
+
+
+class HybridChannelLayer(BaseChannelLayer):
+    extensions = ['groups', 'flush']
+
+    # Seconds between sweeps for messages nobody received
+    sweep_interval = 1.0
+
+    def __init__(self, hosts=None, expiry=60, group_expiry=86400, capacity=100, channel_capacity=None, **kwargs):
+        super().__init__(expiry=expiry, capacity=capacity, channel_capacity=channel_capacity)
+        self.node_id = uuid.uuid4().hex[:12]
+        self.local_prefix = f'{LOCAL_PREFIX}{self.node_id}!'
+        self.node_channel = f'{NODE_PREFIX}{self.node_id}'
+        self.remote = None
+        if hosts:
+            from channels_redis.core import RedisChannelLayer
+            self.remote = RedisChannelLayer(
+                hosts=hosts, expiry=expiry, group_expiry=group_expiry,
+                capacity=capacity, channel_capacity=channel_capacity, **kwargs,
+            )
+        self.queues = {}   # local channel -> asyncio.Queue of (expires, message)
+        self.groups = {}   # group -> set of local channels
+        self._listener = None
+        self._swept = time.monotonic()
+
+    # Where a channel lives
+
+    def is_local(self, channel) -> bool:
+        if self.remote is None:
+            return True
+        return channel.startswith(self.local_prefix)
+
+    def _node_of(self, channel):
+        """The node channel of another process's channel, if it is one of ours"""
+        if channel.startswith(LOCAL_PREFIX) and '!' in channel:
+            return NODE_PREFIX + channel[len(LOCAL_PREFIX):channel.index('!')]
+        return None
+
+    # Local queues
+
+    def _queue(self, channel):
+        queue = self.queues.get(channel)
+        if queue is None:
+            queue = self.queues[channel] = asyncio.Queue(maxsize=self.get_capacity(channel))
+        return queue
+
+    def _deliver(self, channel, message):
+        try:
+            self._queue(channel).put_nowait((time.time() + self.expiry, message))
+        except asyncio.QueueFull:
+            raise ChannelFull(channel)
+
+    def _sweep(self):
+        """Drop expired messages and the channels that stopped receiving them"""
+        now = time.monotonic()
+        if now - self._swept < self.sweep_interval:
+            return
+        self._swept = now
+        cutoff = time.time()
+        for channel, queue in list(self.queues.items()):
+            expired = False
+            while not queue.empty() and queue._queue[0][0] < cutoff:
+                queue.get_nowait()
+                expired = True
+            if expired:
+                # Like the in-memory layer: an expired message means nobody is listening
+                for members in self.groups.values():
+                    members.discard(channel)
+                if queue.empty():
+                    self.queues.pop(channel, None)
+
+    # Remote envelopes
+
+    def _ensure_listener(self):
+        if self.remote is None:
+            return
+        loop = asyncio.get_running_loop()
+        # A listener from a loop that has since closed will never run again
+        if self._listener is None or self._listener.done() or self._listener.get_loop() is not loop:
+            self._listener = loop.create_task(self._listen())
+
+    async def _listen(self):
+        while True:
+            try:
+                envelope = await self.remote.receive(self.node_channel)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception(f"Error receiving on {self.node_channel}")
+                await asyncio.sleep(1)
+                continue
+            if envelope.get('origin') == self.node_id:
+                # Our own group_send coming back; local members already have it
+                continue
+            if envelope.get('group') is not None:
+                self._deliver_group(envelope['group'], envelope['message'])
+            else:
+                try:
+                    self._deliver(envelope['channel'], envelope['message'])
+                except ChannelFull:
+                    logger.info(f"Dropped a message for full channel {envelope['channel']}")
+
+    def _envelope(self, message, group=None, channel=None):
+        return {
+            'type': 'hybrid.envelope',
+            'origin': self.node_id,
+            'group': group,
+            'channel': channel,
+            'message': message,
+        }
+
+    # Channel layer API
+
+    async def new_channel(self, prefix='specific'):
+        self._ensure_listener()
+        return f'{self.local_prefix}{prefix}.{_random_name()}'
+
+    async def send(self, channel, message):
+        assert isinstance(message, dict), "message is not a dict"
+        self.require_valid_channel_name(channel)
+        if self.is_local(channel):
+            self._sweep()
+            self._deliver(channel, message)
+            return
+        node = self._node_of(channel)
+        if node:
+            await self.remote.send(node, self._envelope(message, channel=channel))
+        else:
+            await self.remote.send(channel, message)
+
+    async def receive(self, channel):
+        self.require_valid_channel_name(channel)
+        if not self.is_local(channel):
+            if self._node_of(channel):
+                raise ValueError(f"{channel} belongs to another process")
+            return await self.remote.receive(channel)
+        queue = self._queue(channel)
+        try:
+            while True:
+                expires, message = await queue.get()
+                if expires >= time.time():
+                    return message
+        finally:
+            if queue.empty() and self.queues.get(channel) is queue:
+                del self.queues[channel]
+
+    async def flush(self):
+        self.queues = {}
+        self.groups = {}
+        if self.remote is not None:
+            await self.remote.flush()
+
+    async def close(self):
+        if self._listener is not None:
+            self._listener.cancel()
+            self._listener = None
+        if self.remote is not None:
+            await self.remote.close_pools()
+
+    # Groups extension
+
+    async def group_add(self, group, channel):
+        self.require_valid_group_name(group)
+        self.require_valid_channel_name(channel)
+        if not self.is_local(channel):
+            raise ValueError(f"{channel} must join {group} from the process that created it")
+        self.groups.setdefault(group, set()).add(channel)
+        if self.remote is not None:
+            # Re-adding on every join keeps the node's membership from expiring
+            self._ensure_listener()
+            await self.remote.group_add(group, self.node_channel)
+
+    async def group_discard(self, group, channel):
+        self.require_valid_group_name(group)
+        self.require_valid_channel_name(channel)
+        members = self.groups.get(group)
+        if not members:
+            return
+        members.discard(channel)
+        if not members:
+            del self.groups[group]
+            if self.remote is not None:
+                await self.remote.group_discard(group, self.node_channel)
+
+    def _deliver_group(self, group, message):
+        for channel in list(self.groups.get(group, ())):
+            try:
+                self._deliver(channel, message)
+            except ChannelFull:
+                pass
+
+    async def group_send(self, group, message):
+        assert isinstance(message, dict), "message is not a dict"
+        self.require_valid_group_name(group)
+        self._sweep()
+        self._deliver_group(group, message)
+        if self.remote is not None:
+            await self.remote.group_send(group, self._envelope(message, group=group))
@@ -0,0 +1,288 @@
+# bingo/layouts.py
+"""Seeded board layouts.
+
+A player's board is a (BoardSnapshot, seed) pair. The snapshot is an
+immutable, versioned list of the item ids a board offered at some point,
+one series with suggestions and one without. The seed picks and orders
+the squares, so the layout can be worked out again whenever it is needed,
+and a new board costs nothing but a new seed.
+
+Which snapshot is *current* for a board (its item pool) and the items of
+each snapshot are cached in process and, if ITEM_POOLS names one, in a
+cache shared by every worker. With a shared cache the current snapshot is
+read from it for every layout, so a change reaches all workers at once;
+without one a process keeps its own for LOCAL_TTL seconds. Snapshots
+never change, so their items are kept until evicted. A pool entry is dropped when one of the board's items
+is saved or deleted, or when ``invalidate`` is called after bulk changes.
+The next layout then compares the board's items with the latest snapshot
+and adds a new version if they differ.
+"""
+import random
+import threading
+import time
+from collections import Counter
+from typing import NamedTuple
+from channels.db import database_sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from .models import BingoBoardItem, BoardSnapshot, FREE_SQUARE
+from .itemtable import item_tables
+
+DEFAULTS = {
+    'CACHE': None,       # alias of a cache shared by all workers; None keeps pools per process
+    'LOCAL_TTL': 60,     # seconds a process trusts its own copy of a pool when there is no shared cache
+    'SHARED_TTL': 3600,  # seconds a pool is kept in the shared cache
+}
+
+# Snapshots whose items are kept in memory
+MAX_CACHED_SNAPSHOTS = 256
+
+# Snapshot items never change, so the shared cache may keep them for long
+SNAPSHOT_TTL = 7 * 24 * 3600
+
+
+def _config(key):
+    return getattr(settings, 'ITEM_POOLS', {}).get(key, DEFAULTS[key])
+
+
+class Layout(NamedTuple):
+    snapshot_id: int
+    seed: int
+
+
+def new_seed() -> int:
+    # Fits a signed 32-bit column
+    return random.getrandbits(31)
+
+
+def derive(item_ids, seed, size, has_free_square=False) -> list:
+    """The squares of a seeded board, drawn from a snapshot's item ids.
+
+    A partial Fisher-Yates shuffle driven only by Random.random(), whose
+    output for a given seed Python guarantees across versions, so a layout
+    reads the same after an upgrade.
+    """
+    pool = list(item_ids)
+    rng = random.Random(seed)
+    count = min(size * size, len(pool))
+    for i in range(count):
+        j = i + int(rng.random() * (len(pool) - i))
+        pool[i], pool[j] = pool[j], pool[i]
+    squares = pool[:count]
+    center = (size * size) // 2
+    if has_free_square and size % 2 and center < len(squares):
+        squares[center] = FREE_SQUARE
+    return squares
+
+
+def _pool(board_id, include_suggested) -> list:
+    items = BingoBoardItem.objects.filter(board_id=board_id)
+    if include_suggested:
+        items = items.filter(Q(suggested_by='') | Q(approved=True))
+    else:
+        items = items.filter(suggested_by='')
+    return list(items.order_by('id').values_list('id', flat=True))
+
+
+def _pool_key(board_id, include_suggested):
+    return f'bingo:pool:{board_id}:{int(include_suggested)}'
+
+
+def _snapshot_key(snapshot_id):
+    return f'bingo:snapshot:{snapshot_id}'
+
+
+class Snapshots:
+    """Two-level cache of board item pools and snapshot items"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._current = {}   # (board id, include suggested) -> (snapshot id, time it was checked)
+        self._items = {}     # snapshot id -> tuple of item ids, oldest first
+        self._counters = {'pools': Counter(), 'snapshots': Counter()}
+
+    @property
+    def shared(self):
+        alias = _config('CACHE')
+        return caches[alias] if alias else None
+
+    def _count(self, kind, outcome):
+        with self._lock:
+            self._counters[kind][outcome] += 1
+
+    # Pools
+
+    def _cached_current(self, board_id, include_suggested):
+        with self._lock:
+            entry = self._current.get((board_id, include_suggested))
+        if entry is None or time.monotonic() - entry[1] > _config('LOCAL_TTL'):
+            return None
+        self._count('pools', 'local_hits')
+        return entry[0]
+
+    def _set_current(self, board_id, include_suggested, snapshot_id):
+        with self._lock:
+            self._current[(board_id, include_suggested)] = (snapshot_id, time.monotonic())
+
+    def _load_current(self, board_id, include_suggested) -> int:
+        self._count('pools', 'misses')
+        pool = _pool(board_id, include_suggested)
+        snapshots = BoardSnapshot.objects.filter(board_id=board_id, include_suggested=include_suggested)
+        latest = snapshots.order_by('-version').first()
+        if latest is None or latest.item_ids != pool:
+            try:
+                with transaction.atomic():
+                    latest = BoardSnapshot.objects.create(
+                        board_id=board_id,
+                        include_suggested=include_suggested,
+                        version=latest.version + 1 if latest else 1,
+                        item_ids=pool,
+                    )
+            except IntegrityError:
+                # Another worker added this version first
+                latest = snapshots.order_by('-version').first()
+        self._remember(latest.id, latest.item_ids)
+        self._set_current(board_id, include_suggested, latest.id)
+        if self.shared is not None:
+            self.shared.set(_pool_key(board_id, include_suggested), latest.id, _config('SHARED_TTL'))
+        return latest.id
+
+    def current(self, board_id, include_suggested=True) -> int:
+        """The id of the snapshot new layouts of this board are drawn from"""
+        if self.shared is None:
+            snapshot_id = self._cached_current(board_id, include_suggested)
+        else:
+            # Only the shared entry is dropped for every worker, so it is read each time
+            snapshot_id = self.shared.get(_pool_key(board_id, include_suggested))
+            if snapshot_id is not None:
+                self._count('pools', 'shared_hits')
+        if snapshot_id is None:
+            snapshot_id = self._load_current(board_id, include_suggested)
+        return snapshot_id
+
+    async def acurrent(self, board_id, include_suggested=True) -> int:
+        if self.shared is None:
+            snapshot_id = self._cached_current(board_id, include_suggested)
+        else:
+            snapshot_id = await self.shared.aget(_pool_key(board_id, include_suggested))
+            if snapshot_id is not None:
+                self._count('pools', 'shared_hits')
+        if snapshot_id is None:
+            snapshot_id = await database_sync_to_async(self._load_current)(board_id, include_suggested)
+        return snapshot_id
+
+    def invalidate(self, board_id):
+        """Forget a board's pools, here and in the shared cache"""
+        with self._lock:
+            for key in [key for key in self._current if key[0] == board_id]:
+                del self._current[key]
+        if self.shared is not None:
+            self.shared.delete_many([_pool_key(board_id, True), _pool_key(board_id, False)])
+
+    # Snapshot items
+
+    def _remember(self, snapshot_id, item_ids):
+        with self._lock:
+            self._items[snapshot_id] = tuple(item_ids)
+            while len(self._items) > MAX_CACHED_SNAPSHOTS:
+                del self._items[next(iter(self._items))]
+
+    def _local_items(self, snapshot_id):
+        items = self._items.get(snapshot_id)
+        if items is not None:
+            self._count('snapshots', 'local_hits')
+        return items
+
+    def _load_items(self, snapshot_id) -> tuple:
+        self._count('snapshots', 'misses')
+        item_ids = BoardSnapshot.objects.values_list('item_ids', flat=True).get(id=snapshot_id)
+        self._remember(snapshot_id, item_ids)
+        if self.shared is not None:
+            self.shared.set(_snapshot_key(snapshot_id), item_ids, SNAPSHOT_TTL)
+        return self._items[snapshot_id]
+
+    def items(self, snapshot_id) -> tuple:
+        """A snapshot's item ids"""
+        items = self._local_items(snapshot_id)
+        if items is None and self.shared is not None:
+            item_ids = self.shared.get(_snapshot_key(snapshot_id))
+            if item_ids is not None:
+                self._count('snapshots', 'shared_hits')
+                self._remember(snapshot_id, item_ids)
+                items = self._items[snapshot_id]
+        if items is None:
+            items = self._load_items(snapshot_id)
+        return items
+
+    async def aitems(self, snapshot_id) -> tuple:
+        items = self._local_items(snapshot_id)
+        if items is None and self.shared is not None:
+            item_ids = await self.shared.aget(_snapshot_key(snapshot_id))
+            if item_ids is not None:
+                self._count('snapshots', 'shared_hits')
+                self._remember(snapshot_id, item_ids)
+                items = self._items[snapshot_id]
+        if items is None:
+            items = await database_sync_to_async(self._load_items)(snapshot_id)
+        return items
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = {'shared_cache': _config('CACHE'), 'cached_snapshots': len(self._items)}
+            for kind, counts in self._counters.items():
+                lookups = sum(counts.values())
+                stats[kind] = {outcome: counts[outcome] for outcome in ('local_hits', 'shared_hits', 'misses')}
+                stats[kind]['hit_rate'] = round(1 - counts['misses'] / lookups, 4) if lookups else None
+            return stats
+
+
+snapshots = Snapshots()
+
+
+def new_layout(board_id, include_suggested=True) -> Layout:
+    return Layout(snapshots.current(board_id, include_suggested), new_seed())
+
+
+async def anew_layout(board_id, include_suggested=True) -> Layout:
+    return Layout(await snapshots.acurrent(board_id, include_suggested), new_seed())
+
+
+def player_item_ids(player) -> list:
+    """A player's squares as item ids. Reads the game and possibly the snapshot."""
+    if player.layout_seed is None:
+        # Boards dealt before seeded layouts store their ids
+        return player.board_item_ids
+    game = player.game
+    return derive(snapshots.items(player.layout_snapshot_id), player.layout_seed, game.board_size, game.has_free_square)
+
+
+async def aplayer_item_ids(player) -> list:
+    """Async version of player_item_ids; the game must already be loaded"""
+    if player.layout_seed is None:
+        return player.board_item_ids
+    game = player.game
+    items = await snapshots.aitems(player.layout_snapshot_id)
+    return derive(items, player.layout_seed, game.board_size, game.has_free_square)
+
+
+def invalidate(board_id):
+    """Call after changing a board's items without saving them one by one, e.g. bulk_create"""
+    snapshots.invalidate(board_id)
+    item_tables.invalidate(board_id)
+
+
+@receiver(post_save, sender=BingoBoardItem)
+def _item_saved(sender, instance, created, **kwargs):
+    if created and instance.suggested_by and instance.approved is None:
+        # A new suggestion is in no pool until it is approved
+        return
+    snapshots.invalidate(instance.board_id)
+
+
+@receiver(post_delete, sender=BingoBoardItem)
+def _item_deleted(sender, instance, **kwargs):
+    snapshots.invalidate(instance.board_id)
@@ -0,0 +1,236 @@
+# bingo/lobby.py
+"""Cached read model of the public game lobby.
+
+The home page lists every open public game. Instead of querying them on
+each load, the list is built once, with player counts, and kept in the
+cache framework until a game is saved or deleted. Player counts can lag
+by up to TTL seconds, since a join doesn't drop the list.
+
+Every version of the list gets an ETag from its contents and VERSION, and
+the time it last changed, so home can answer repeat visitors with 304 Not
+Modified and templates can key fragment caches on it. Deploys that change
+the page bump VERSION so nobody keeps an old one.
+
+Open home pages also listen on the ``lobby`` group through LobbyConsumer.
+Save hooks publish each change there as out-of-band htmx swaps, rendered
+once here for signed-in and anonymous visitors. Player counts are
+collected for COUNT_INTERVAL seconds and published together, so a burst
+of joins is one broadcast rather than one per join.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import threading
+from asgiref.sync import async_to_sync
+from channels.db import database_sync_to_async
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import Count
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.template.loader import render_to_string
+from django.utils import timezone
+from .background import BackgroundTask
+from .fragments import arender_to_string
+from .models import BingoBoard, BingoGame, Player
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'CACHE': 'default',   # alias of the cache holding the lobby; share it between workers
+    'TTL': 30,            # seconds before player counts are refreshed
+    'COUNT_INTERVAL': 2,  # seconds player count changes are collected before they are broadcast
+    'VERSION': '',        # release of the templates and assets; a new one invalidates every ETag and fragment
+}
+
+LOBBY_GROUP = 'lobby'
+
+LOBBY_KEY = 'bingo:lobby:{version}'
+# When the list last changed, kept beyond TTL so an unchanged rebuild keeps its Last-Modified
+CHANGED_KEY = 'bingo:lobby:{version}:changed'
+
+
+def _config(key):
+    return getattr(settings, 'LOBBY', {}).get(key, DEFAULTS[key])
+
+
+def _cache():
+    return caches[_config('CACHE')]
+
+
+def _lobby_key():
+    return LOBBY_KEY.format(version=_config('VERSION'))
+
+
+def _changed_key():
+    return CHANGED_KEY.format(version=_config('VERSION'))
+
+
+def _boards_key(user_id):
+    return f'bingo:lobby:boards:{user_id}'
+
+
+def _build() -> dict:
+    games = list(
+        BingoGame.objects.filter(is_active=True, is_private=False)
+        .annotate(players_count=Count('players'))
+        .order_by('-created_at')
+        .values('id', 'name', 'code', 'is_spectateable', 'players_count')
+    )
+    for game in games:
+        game['players'] = game.pop('players_count')
+    etag = hashlib.sha1(json.dumps([_config('VERSION'), games], sort_keys=True).encode()).hexdigest()[:16]
+    changed = _cache().get(_changed_key())
+    if changed is None or changed[0] != etag:
+        changed = (etag, timezone.now().replace(microsecond=0))
+        _cache().set(_changed_key(), changed, None)
+    return {'games': games, 'etag': etag, 'modified': changed[1], 'version': _config('VERSION')}
+
+
+def current() -> dict:
+    """The lobby: ``games`` as dicts, their ``etag`` and when they were last ``modified``"""
+    lobby = _cache().get(_lobby_key())
+    if lobby is None:
+        lobby = _build()
+        _cache().set(_lobby_key(), lobby, _config('TTL'))
+    return lobby
+
+
+def boards(user) -> list:
+    """The boards a user created, newest first"""
+    key = _boards_key(user.id)
+    result = _cache().get(key)
+    if result is None:
+        result = list(
+            BingoBoard.objects.filter(creator=user).order_by('-created_at').values('id', 'name', 'created_at')
+        )
+        _cache().set(key, result, None)
+    return result
+
+
+def invalidate():
+    _cache().delete(_lobby_key())
+
+
+def render_games(games, signed_in) -> str:
+    """The whole games list, replacing the one on the page"""
+    return render_to_string('bingo/partials/lobby_games.html', {'games': games, 'signed_in': signed_in, 'oob': True})
+
+
+async def arender_games(games, signed_in) -> str:
+    return await arender_to_string('bingo/partials/lobby_games.html', {'games': games, 'signed_in': signed_in, 'oob': True})
+
+
+def _render_for_both(render) -> dict:
+    return {'html': render(signed_in=False), 'signed_in_html': render(signed_in=True)}
+
+
+def publish(message):
+    """Send a message to every open lobby; a missing channel layer never breaks the save that caused it"""
+    try:
+        async_to_sync(get_channel_layer().group_send)(LOBBY_GROUP, message)
+    except Exception:
+        logger.exception(f"Could not publish {message['type']} to the lobby")
+
+
+def _publish_opened(game):
+    entry = {
+        'id': game.id, 'name': game.name, 'code': game.code,
+        'is_spectateable': game.is_spectateable, 'players': 0,
+    }
+    publish(dict(_render_for_both(lambda signed_in: (
+        '<div hx-swap-oob="afterbegin:#game-list">'
+        + render_to_string('bingo/partials/lobby_game.html', {'game': entry, 'signed_in': signed_in})
+        + '</div>'
+    )), type='lobby.update'))
+
+
+def _publish_list():
+    games = current()['games']
+    publish(dict(_render_for_both(lambda signed_in: render_games(games, signed_in)), type='lobby.update'))
+
+
+def _publish_closed(game_id):
+    html = f'<div id="game-card-{game_id}" hx-swap-oob="delete"></div>'
+    publish({'type': 'lobby.update', 'html': html, 'signed_in_html': html})
+
+
+class CountPublisher(BackgroundTask):
+    """Collects games whose player count changed and broadcasts their counts every COUNT_INTERVAL.
+
+    A process without the background task running publishes counts right away.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._lock = threading.Lock()
+        self._games = set()
+
+    def changed(self, game_id):
+        """Note a game's player count changed. Safe to call from any thread."""
+        with self._lock:
+            self._games.add(game_id)
+        if not self.wake():
+            publish(self.message())
+
+    def message(self) -> dict:
+        """The counts of every game noted since the last message"""
+        with self._lock:
+            game_ids, self._games = self._games, set()
+        rows = (
+            BingoGame.objects.filter(id__in=game_ids, is_active=True, is_private=False)
+            .annotate(players_count=Count('players'))
+            .values_list('id', 'players_count')
+        ) if game_ids else []
+        html = ''.join(f'<span id="game-players-{game_id}" hx-swap-oob="true">{count}</span>' for game_id, count in rows)
+        return {'type': 'lobby.update', 'html': html, 'signed_in_html': html}
+
+    async def _run(self):
+        while True:
+            await self.wait()
+            # Let the rest of a burst of joins arrive
+            await asyncio.sleep(_config('COUNT_INTERVAL'))
+            self._wakeup.clear()
+            try:
+                message = await database_sync_to_async(self.message)()
+                if message['html']:
+                    await get_channel_layer().group_send(LOBBY_GROUP, message)
+            except Exception:
+                logger.exception("Error publishing lobby player counts")
+
+
+counts = CountPublisher()
+
+
+@receiver(post_save, sender=BingoGame)
+def _game_saved(sender, instance, created, **kwargs):
+    # Covers new games, ended ones and ones made private; any other save is cheap to rebuild after
+    invalidate()
+    if created and instance.is_active and not instance.is_private:
+        transaction.on_commit(lambda: _publish_opened(instance))
+    elif not created:
+        transaction.on_commit(_publish_list)
+
+
+@receiver(post_delete, sender=BingoGame)
+def _game_deleted(sender, instance, **kwargs):
+    invalidate()
+    game_id = instance.id
+    transaction.on_commit(lambda: _publish_closed(game_id))
+
+
+@receiver(post_save, sender=Player)
+@receiver(post_delete, sender=Player)
+def _player_changed(sender, instance, **kwargs):
+    if kwargs.get('created', True):
+        game_id = instance.game_id
+        transaction.on_commit(lambda: counts.changed(game_id))
+
+
+@receiver(post_save, sender=BingoBoard)
+@receiver(post_delete, sender=BingoBoard)
+def _board_changed(sender, instance, **kwargs):
+    _cache().delete(_boards_key(instance.creator_id))
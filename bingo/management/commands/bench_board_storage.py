@@ -0,0 +1,87 @@
+# bingo/management/commands/bench_board_storage.py
+import json
+import random
+from django.core.management.base import BaseCommand
+from django.db import connection
+from bingo.models import User, BingoBoard, BingoBoardItem, BingoGame, Player
+
+WORDS = [
+    'someone', 'says', 'synergy', 'the', 'wifi', 'drops', 'coffee', 'runs', 'out', 'meeting',
+    'could', 'have', 'been', 'an', 'email', 'dog', 'barks', 'on', 'call', 'you', 'are', 'muted',
+    'screen', 'share', 'fails', 'late', 'again', 'deadline', 'moves', 'circle', 'back',
+]
+
+
+class Command(BaseCommand):
+    help = 'Compare how much space player boards take in each storage form on a throwaway sample database'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--players', type=int, default=5000)
+        parser.add_argument('--items', type=int, default=60, help='Items on the shared board')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            self.create_sample(options['players'], options['items'], rng)
+            self.report()
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    def create_sample(self, players, items, rng):
+        user = User.objects.create(username='bench')
+        board = BingoBoard.objects.create(name='Bench', creator=user)
+        BingoBoardItem.objects.bulk_create(
+            BingoBoardItem(board=board, text=' '.join(rng.sample(WORDS, rng.randint(3, 6)))[:64])
+            for _ in range(items)
+        )
+        game = BingoGame.objects.create(board=board, creator=user, has_free_square=True)
+        Player.objects.bulk_create(
+            Player(
+                game=game,
+                name=f'Player {i}',
+                layout=game.generate_board_layout(),
+                covered_positions=rng.sample(range(25), rng.randint(0, 12)),
+            )
+            for i in range(players)
+        )
+
+    def report(self):
+        players = list(Player.objects.select_related('game'))
+        # The same boards as texts and a list of positions, as item ids and a bitmask, and as seeds
+        forms = {
+            'texts': [(json.dumps(player.board_layout), json.dumps(player.covered_positions)) for player in players],
+            'item ids': [(json.dumps(player.item_ids), player.covered_mask) for player in players],
+            'seeded': [(player.layout_snapshot_id, player.layout_seed, player.covered_mask) for player in players],
+        }
+        columns = {
+            'texts': 'board_layout text, covered_positions text',
+            'item ids': 'board_item_ids text, covered_mask integer',
+            'seeded': 'layout_snapshot_id integer, layout_seed integer, covered_mask integer',
+        }
+
+        self.stdout.write(f'{len(players)} players on one board')
+        if connection.vendor != 'sqlite':
+            self.stdout.write('Table sizes need SQLite')
+            return
+        self.stdout.write(f'{"storage":>10} {"KiB":>8} {"bytes/player":>13}')
+        for name, rows in forms.items():
+            size = self.table_bytes(name.replace(' ', '_'), columns[name], rows)
+            if size is None:
+                self.stdout.write('SQLite was built without the dbstat table')
+                return
+            self.stdout.write(f'{name:>10} {size / 1024:>8.0f} {size / len(players):>13.0f}')
+
+    def table_bytes(self, name, columns, rows):
+        with connection.cursor() as cursor:
+            name = f'bench_{name}'
+            cursor.execute(f'CREATE TABLE {name} (id integer primary key, {columns})')
+            placeholders = ', '.join(['%s'] * len(rows[0]))
+            cursor.executemany(f'INSERT INTO {name} VALUES (NULL, {placeholders})', rows)
+            try:
+                cursor.execute('SELECT SUM(pgsize) FROM dbstat WHERE name = %s', [name])
+            except Exception:
+                # SQLite built without the dbstat table
+                return None
+            return cursor.fetchone()[0]
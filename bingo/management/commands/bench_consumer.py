@@ -0,0 +1,116 @@
+# bingo/management/commands/bench_consumer.py
+import asyncio
+import json
+import random
+import statistics
+import time
+from asgiref.sync import sync_to_async
+from channels.layers import channel_layers
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import override_settings
+from bingo.models import User, BingoBoard, BingoBoardItem, BingoGame, Player
+from bingo.broadcast import coalescer
+from bingo.protocol import DELTA_SUBPROTOCOL
+
+
+class Command(BaseCommand):
+    help = 'Measure mark_position round-trip latency through BingoGameConsumer on a throwaway test database'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--players', type=int, default=20, help='Connected players in the game')
+        parser.add_argument('--marks', type=int, default=500, help='Marks to time')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--delta', action='store_true', help='Connect with the JSON delta protocol')
+        parser.add_argument('--window', type=float, help='Event coalescing window in seconds, 0 to turn it off')
+
+    def handle(self, *args, **options):
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            # Keep the measurement about the consumer, not about Redis
+            overrides = {
+                'CHANNEL_LAYERS': {'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}},
+                # The benchmark marks far faster than any player could
+                'RATE_LIMITS': {'ENABLED': False},
+            }
+            if options['window'] is not None:
+                overrides['EVENT_COALESCING'] = {'ENABLED': True, 'WINDOW': options['window']}
+            with override_settings(**overrides):
+                channel_layers.backends.clear()
+                latencies, sent = asyncio.run(self.run(
+                    options['players'], options['marks'], random.Random(options['seed']), options['delta'],
+                ))
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            channel_layers.backends.clear()
+
+        latencies.sort()
+        ms = [latency * 1000 for latency in latencies]
+        self.stdout.write(f"{len(ms)} marks across {options['players']} players")
+        self.stdout.write(f"  {sent / len(ms):.0f} bytes sent per mark, summed over every player")
+        self.stdout.write(f'  mean {statistics.mean(ms):7.3f} ms')
+        self.stdout.write(f'  p50  {ms[len(ms) // 2]:7.3f} ms')
+        self.stdout.write(f'  p95  {ms[int(len(ms) * 0.95)]:7.3f} ms')
+        self.stdout.write(f'  p99  {ms[int(len(ms) * 0.99)]:7.3f} ms')
+        self.stdout.write(f'  max  {ms[-1]:7.3f} ms')
+
+    def create_game(self, players):
+        user = User.objects.create(username='bench')
+        board = BingoBoard.objects.create(name='Benchmark', creator=user)
+        BingoBoardItem.objects.bulk_create(
+            BingoBoardItem(board=board, text=f'Square {i}') for i in range(40)
+        )
+        game = BingoGame.objects.create(board=board, creator=user, name='Benchmark')
+        return [
+            Player.objects.create(game=game, name=f'Player {i}', layout=game.generate_board_layout()).id
+            for i in range(players)
+        ]
+
+    async def run(self, players, marks, rng, delta):
+        from bingo.routing import websocket_urlpatterns
+        application = URLRouter(websocket_urlpatterns)
+
+        player_ids = await sync_to_async(self.create_game)(players)
+        communicators = []
+        for player_id in player_ids:
+            communicator = WebsocketCommunicator(
+                application, f'/ws/play/{player_id}/', subprotocols=[DELTA_SUBPROTOCOL] if delta else None,
+            )
+            connected, _ = await communicator.connect()
+            if not connected:
+                raise RuntimeError(f'Player {player_id} could not connect')
+            communicators.append(communicator)
+        # Leave the initial game state out of the byte count
+        await asyncio.sleep(0.1)
+        for communicator in communicators:
+            while not communicator.output_queue.empty():
+                communicator.output_queue.get_nowait()
+
+        cell_marker = '"t":"m"' if delta else 'id="cell-'
+        latencies = []
+        sent = 0
+        for _ in range(marks):
+            communicator = rng.choice(communicators)
+            started = time.perf_counter()
+            await communicator.send_to(text_data=json.dumps({
+                'type': 'mark_position',
+                'position': str(rng.randrange(25)),
+            }))
+            # Events from the other players can be queued ahead of our cell
+            while True:
+                text = (await communicator.output_queue.get()).get('text', '')
+                sent += len(text.encode())
+                if cell_marker in text:
+                    break
+            latencies.append(time.perf_counter() - started)
+
+        # Count whatever the other players have not read yet
+        await asyncio.sleep((coalescer.window if coalescer.enabled else 0) + 0.1)
+        for communicator in communicators:
+            while not communicator.output_queue.empty():
+                sent += len(communicator.output_queue.get_nowait().get('text', '').encode())
+        for communicator in communicators:
+            await communicator.disconnect()
+        return latencies, sent
@@ -0,0 +1,83 @@
+# bingo/management/commands/bench_fanout.py
+import asyncio
+import statistics
+import time
+from channels.layers import InMemoryChannelLayer, channel_layers, get_channel_layer
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+from bingo import groups, protocol
+from bingo.broadcast import render_event, PLAYER_EVENT_LIFETIME
+from bingo.layers import HybridChannelLayer
+
+
+class Command(BaseCommand):
+    help = 'Measure how long publishing one game event takes against group size and shard count'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--members', type=int, nargs='+', default=[10, 100, 1000, 5000])
+        parser.add_argument('--shards', type=int, nargs='+', default=[1, 4, 16])
+        parser.add_argument('--sends', type=int, default=20, help='Publishes timed per configuration')
+        parser.add_argument('--layer', choices=['configured', 'memory', 'hybrid'], default='configured',
+                            help="Channel layer to measure; 'hybrid' runs it single-node, without Redis")
+
+    def handle(self, *args, **options):
+        overrides = {}
+        if options['layer'] == 'memory':
+            overrides['CHANNEL_LAYERS'] = {'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}}
+        elif options['layer'] == 'hybrid':
+            overrides['CHANNEL_LAYERS'] = {'default': {'BACKEND': 'bingo.layers.HybridChannelLayer'}}
+        with override_settings(**overrides):
+            channel_layers.backends.clear()
+            try:
+                asyncio.run(self.run(options))
+            finally:
+                channel_layers.backends.clear()
+
+    def sample_message(self):
+        game_event = {'player': 'Benchmark', 'message': "Benchmark marked 'Square 7'", 'created_at': time.time() * 1000}
+        return {
+            'type': 'player_event',
+            'game_event': game_event,
+            'html': render_event(game_event, remove_in=PLAYER_EVENT_LIFETIME),
+            'spectator_html': render_event(game_event, remove_in=0),
+            'delta': protocol.event(game_event, remove_in=PLAYER_EVENT_LIFETIME),
+            'spectator_delta': protocol.event(game_event),
+            'player_id': 0,
+            'sender': '',
+        }
+
+    async def run(self, options):
+        channel_layer = get_channel_layer()
+        self.stdout.write(f'{type(channel_layer).__name__}, median of {options["sends"]} publishes')
+        self.stdout.write(f'{"members":>8} {"shards":>7} {"publish ms":>11} {"per member us":>14}')
+        message = self.sample_message()
+        for run, members in enumerate(options['members']):
+            for shards in options['shards']:
+                with override_settings(GAME_GROUPS={'PLAYER_SHARDS': shards, 'SPECTATOR_SHARDS': 1}):
+                    code = f'BENCH{run}x{shards}'
+                    timings = await self.measure(channel_layer, code, members, message, options['sends'])
+                median = statistics.median(timings)
+                self.stdout.write(f'{members:>8} {shards:>7} {median * 1000:>11.3f} {median / members * 1e6:>14.3f}')
+
+    async def measure(self, channel_layer, code, members, message, sends):
+        joined = []
+        for _ in range(members):
+            channel = await channel_layer.new_channel()
+            group = groups.player_group(code, channel)
+            await channel_layer.group_add(group, channel)
+            joined.append((group, channel))
+        timings = []
+        try:
+            for _ in range(sends):
+                started = time.perf_counter()
+                await groups.group_send(code, message, spectators=False, channel_layer=channel_layer)
+                timings.append(time.perf_counter() - started)
+        finally:
+            for group, channel in joined:
+                await channel_layer.group_discard(group, channel)
+            # Only ever flush our own throwaway layers; on Redis the messages expire
+            if isinstance(channel_layer, InMemoryChannelLayer) or (
+                isinstance(channel_layer, HybridChannelLayer) and channel_layer.remote is None
+            ):
+                await channel_layer.flush()
+        return timings
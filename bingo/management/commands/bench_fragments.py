@@ -0,0 +1,62 @@
+# bingo/management/commands/bench_fragments.py
+import random
+import timeit
+from types import SimpleNamespace
+from django.core.management.base import BaseCommand, CommandError
+from django.template.loader import render_to_string
+from bingo.fragments import fragments, CELL_TEMPLATE, BOARD_TEMPLATE, EVENT_TEMPLATE
+
+
+class Command(BaseCommand):
+    help = 'Compare the compiled fragment renderer against render_to_string'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seconds', type=float, default=1.0, help='Time budget per measurement')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        fragments.compile()
+        samples = self.samples(rng)
+
+        # Renders per second mean nothing unless the output is the same
+        for name, template_path, fast in samples:
+            if fast() != template_path():
+                raise CommandError(f'{name}: compiled output differs from the template')
+        self.stdout.write('Compiled output is byte-identical to the templates')
+
+        for name, template_path, fast in samples:
+            slow_rate = self.rate(template_path, options['seconds'])
+            fast_rate = self.rate(fast, options['seconds'])
+            self.stdout.write(
+                f'{name:<6} template {slow_rate:>10,.0f}/s   compiled {fast_rate:>12,.0f}/s'
+                f'   {fast_rate / slow_rate:6.1f}x'
+            )
+
+    def rate(self, func, seconds):
+        timer = timeit.Timer(func)
+        number, elapsed = timer.autorange()
+        number = max(1, int(number * seconds / elapsed))
+        return number / timer.timeit(number)
+
+    def samples(self, rng):
+        words = ['Flag toss', 'Rifle drop', 'Sabre catch', 'Tom & Jerry', '<Spin>', 'Fan "wave"', 'Dip']
+        texts = [f'{rng.choice(words)} {i}' for i in range(25)]
+        game = SimpleNamespace(board_size=5, has_free_square=True)
+        player = SimpleNamespace(id=1, board_layout=texts, covered_positions=rng.sample(range(25), 9) + [12])
+        cell = {'position': 12, 'text': texts[3], 'covered': True, 'free': False}
+        event = {
+            'player': 'Sunny Otter',
+            'message': f"Sunny Otter marked '{texts[3]}'",
+            'created_at': 1760790000123.456,
+            'remove_in': 90,
+            'class': '',
+        }
+        board_context = {
+            'player': player, 'game': game, 'board_items': texts, 'board_positions': range(25),
+        }
+        return [
+            ('cell', lambda: render_to_string(CELL_TEMPLATE, cell), lambda: fragments.render_cell(**cell)),
+            ('board', lambda: render_to_string(BOARD_TEMPLATE, board_context), lambda: fragments.render_board(player, game)),
+            ('event', lambda: render_to_string(EVENT_TEMPLATE, {'event': event}), lambda: fragments.render_event(event)),
+        ]
@@ -0,0 +1,78 @@
+# bingo/management/commands/bench_wincheck.py
+import random
+import timeit
+from django.core.management.base import BaseCommand
+from bingo.wincheck import LineTracker, is_win, positions_to_mask
+
+
+def legacy_check_win_condition(size, win_condition, covered_positions):
+    """The list-based check BingoGame used before the bitboard engine"""
+    if win_condition == 'all':
+        return len(covered_positions) == (size * size)
+    winning_patterns = []
+    for i in range(size):
+        winning_patterns.append(list(range(i * size, (i + 1) * size)))
+    for i in range(size):
+        winning_patterns.append(list(range(i, size * size, size)))
+    winning_patterns.append(list(range(0, size * size, size + 1)))
+    winning_patterns.append(list(range(size - 1, size * (size - 1) + 1, size - 1)))
+    covered_set = set(covered_positions)
+    return any(all(pos in covered_set for pos in pattern) for pattern in winning_patterns)
+
+
+class Command(BaseCommand):
+    help = 'Compare the bitboard win check against the legacy list-based check'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--number', type=int, default=20000, help='Checks per measurement')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        number = options['number']
+        rng = random.Random(options['seed'])
+
+        for size in (4, 5):
+            for win_condition in ('traditional', 'all'):
+                cells = size * size
+                boards = [rng.sample(range(cells), rng.randint(0, cells)) for _ in range(256)]
+
+                # The engines have to agree before their timings mean anything
+                for covered in boards:
+                    expected = legacy_check_win_condition(size, win_condition, covered)
+                    tracker = LineTracker(size, win_condition, covered)
+                    assert is_win(positions_to_mask(covered), size, win_condition) == expected
+                    assert tracker.has_won == expected, (size, win_condition, covered)
+
+                def run_legacy():
+                    for covered in boards:
+                        legacy_check_win_condition(size, win_condition, covered)
+
+                masks = [positions_to_mask(covered) for covered in boards]
+
+                def run_bitboard():
+                    for mask in masks:
+                        is_win(mask, size, win_condition)
+
+                # A player's session: one mark or unmark followed by a check
+                tracker = LineTracker(size, win_condition)
+                clicks = [rng.randrange(cells) for _ in range(len(boards))]
+
+                def run_tracker():
+                    for position in clicks:
+                        tracker.toggle(position)
+                        tracker.has_won
+
+                repeat = max(1, number // len(boards))
+                results = [
+                    ('legacy', timeit.timeit(run_legacy, number=repeat)),
+                    ('bitboard', timeit.timeit(run_bitboard, number=repeat)),
+                    ('tracker', timeit.timeit(run_tracker, number=repeat)),
+                ]
+                checks = repeat * len(boards)
+                baseline = results[0][1]
+                self.stdout.write(f'{size}x{size} {win_condition}:')
+                for name, elapsed in results:
+                    self.stdout.write(
+                        f'  {name:<9} {elapsed / checks * 1e6:8.3f} us/check'
+                        f'  {baseline / elapsed:6.1f}x'
+                    )
@@ -0,0 +1,19 @@
+# bingo/management/commands/compact_game_events.py
+from django.core.management.base import BaseCommand
+from bingo import retention
+
+
+class Command(BaseCommand):
+    help = 'Fold old and finished games\' events into per-game summaries, then delete raw events past their age'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--games', type=int, default=None, help='Compact at most this many games this run')
+        parser.add_argument('--no-purge', action='store_true', help='Only compact, keep every raw event')
+
+    def handle(self, *args, **options):
+        # Safe to interrupt: every batch commits on its own and the next run picks up after it
+        folded = retention.compact(limit=options['games'])
+        self.stdout.write(f'Compacted {folded} events')
+        if not options['no_purge']:
+            deleted = retention.purge()
+            self.stdout.write(f'Deleted {deleted} raw events')
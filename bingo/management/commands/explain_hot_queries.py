@@ -0,0 +1,65 @@
+# bingo/management/commands/explain_hot_queries.py
+import re
+from datetime import timedelta
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+from bingo.models import BingoBoardItem, BingoGame, GameEvent, Player
+
+# A plan line that reads a whole table, by backend
+FULL_SCAN = {
+    'sqlite': re.compile(r'\bSCAN (?!.*\bUSING (COVERING )?INDEX\b)'),
+    'postgresql': re.compile(r'\bSeq Scan\b'),
+}
+
+
+def hot_queries():
+    """The lookups that run on every page load, socket connect or new board, by name"""
+    now = timezone.now()
+    # Any ids do: the plan depends on the shape of the query, not on which rows match
+    return {
+        'latest events': GameEvent.objects.filter(game_id=1, created_at__gt=now - timedelta(seconds=60)),
+        'all events': GameEvent.objects.filter(game_id=1),
+        'players of a game': Player.objects.filter(game_id=1),
+        'board pool': BingoBoardItem.objects.filter(board_id=1, suggested_by='').order_by('id'),
+        'board pool with suggestions': BingoBoardItem.objects.filter(board_id=1).filter(
+            Q(suggested_by='') | Q(approved=True)
+        ).order_by('id'),
+        'suggestion duplicate': BingoBoardItem.objects.filter(board_id=1, text='item'),
+        'pending suggestions': BingoBoardItem.objects.exclude(suggested_by='').filter(approved__isnull=True),
+        'lobby': BingoGame.objects.filter(is_active=True, is_private=False).order_by('-created_at'),
+        'recyclable codes': BingoGame.objects.filter(is_active=False, ended_at__lte=now, code__isnull=False),
+    }
+
+
+class Command(BaseCommand):
+    help = 'EXPLAIN the hot queries on the configured database and fail if any of them scans a whole table'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--verbose-plans', action='store_true', help='Print every plan, not only failing ones')
+
+    def handle(self, *args, **options):
+        full_scan = FULL_SCAN.get(connection.vendor)
+        if full_scan is None:
+            raise CommandError(f'No scan pattern for {connection.vendor}; supported: {", ".join(FULL_SCAN)}')
+
+        failures = []
+        for name, queryset in hot_queries().items():
+            with transaction.atomic():
+                if connection.vendor == 'postgresql':
+                    # Small tables are cheaper to scan; only fail when no index could be used at all
+                    with connection.cursor() as cursor:
+                        cursor.execute('SET LOCAL enable_seqscan = off')
+                plan = queryset.explain()
+            scans = [line.strip() for line in plan.splitlines() if full_scan.search(line)]
+            status = 'SCAN' if scans else 'ok'
+            self.stdout.write(f'{status:>4}  {name}')
+            if scans or options['verbose_plans']:
+                for line in plan.splitlines():
+                    self.stdout.write(f'      {line}')
+            if scans:
+                failures.append(name)
+
+        if failures:
+            raise CommandError(f'Full table scans in: {", ".join(failures)}')
@@ -0,0 +1,14 @@
+# bingo/management/commands/refill_game_codes.py
+from django.core.management.base import BaseCommand
+from bingo import gamecodes
+
+
+class Command(BaseCommand):
+    help = 'Return the codes of long-ended games to the game code pool and top it up'
+
+    def handle(self, *args, **options):
+        # Games allocate and refill on their own; this just keeps the work off a request
+        added = gamecodes.refill()
+        self.stdout.write(f'Added {added} codes')
+        for length, free in gamecodes.stats().items():
+            self.stdout.write(f'{length} letters: {free} free')
@@ -0,0 +1,17 @@
+# Generated by Django 6.1.2 on 2026-10-18 11:59
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bingo', '0010_gameevent_created_at_default'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='player',
+            name='is_connected',
+        ),
+    ]
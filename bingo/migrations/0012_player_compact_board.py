@@ -0,0 +1,97 @@
+# Generated by Django 6.1.2 on 2026-10-18 14:20
+
+from django.db import migrations, models
+
+FREE_SQUARE = 0
+FREE_TEXT = 'FREE'
+BATCH_SIZE = 500
+
+
+def texts_to_ids(apps, schema_editor):
+    """Replace each player's layout texts with item ids and their coverage with a bitmask"""
+    Player = apps.get_model('bingo', 'Player')
+    BingoBoardItem = apps.get_model('bingo', 'BingoBoardItem')
+    ids_by_board = {}
+    batch = []
+    for player in Player.objects.select_related('game').order_by('id').iterator(chunk_size=BATCH_SIZE):
+        board_id = player.game.board_id
+        if board_id not in ids_by_board:
+            ids = {}
+            for item_id, text in BingoBoardItem.objects.filter(board_id=board_id).order_by('-id').values_list('id', 'text'):
+                ids[text] = item_id   # lowest id wins for duplicate texts
+            ids_by_board[board_id] = ids
+        ids = ids_by_board[board_id]
+        item_ids = []
+        for text in player.board_layout or []:
+            if text == FREE_TEXT and FREE_TEXT not in ids:
+                item_ids.append(FREE_SQUARE)
+                continue
+            if text not in ids:
+                # The item was renamed or deleted since; keep the text as a hidden item
+                ids[text] = BingoBoardItem.objects.create(
+                    board_id=board_id, text=text[:64], suggested_by='(archived)', approved=False,
+                ).id
+            item_ids.append(ids[text])
+        player.board_item_ids = item_ids
+        player.covered_mask = 0
+        for position in player.covered_positions or []:
+            player.covered_mask |= 1 << int(position)
+        batch.append(player)
+        if len(batch) >= BATCH_SIZE:
+            Player.objects.bulk_update(batch, ['board_item_ids', 'covered_mask'])
+            batch = []
+    if batch:
+        Player.objects.bulk_update(batch, ['board_item_ids', 'covered_mask'])
+
+
+def ids_to_texts(apps, schema_editor):
+    Player = apps.get_model('bingo', 'Player')
+    BingoBoardItem = apps.get_model('bingo', 'BingoBoardItem')
+    texts = dict(BingoBoardItem.objects.values_list('id', 'text'))
+    batch = []
+    for player in Player.objects.order_by('id').iterator(chunk_size=BATCH_SIZE):
+        player.board_layout = [
+            FREE_TEXT if item_id == FREE_SQUARE else texts.get(item_id, '') for item_id in player.board_item_ids
+        ]
+        player.covered_positions = [position for position in range(32) if player.covered_mask >> position & 1]
+        batch.append(player)
+        if len(batch) >= BATCH_SIZE:
+            Player.objects.bulk_update(batch, ['board_layout', 'covered_positions'])
+            batch = []
+    if batch:
+        Player.objects.bulk_update(batch, ['board_layout', 'covered_positions'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bingo', '0011_remove_player_is_connected'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='player',
+            name='board_item_ids',
+            field=models.JSONField(default=list),
+        ),
+        migrations.AddField(
+            model_name='player',
+            name='covered_mask',
+            field=models.IntegerField(default=0),
+        ),
+        # A default lets the column be added back when migrating backwards
+        migrations.AlterField(
+            model_name='player',
+            name='board_layout',
+            field=models.JSONField(default=list),
+        ),
+        migrations.RunPython(texts_to_ids, ids_to_texts),
+        migrations.RemoveField(
+            model_name='player',
+            name='board_layout',
+        ),
+        migrations.RemoveField(
+            model_name='player',
+            name='covered_positions',
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 6.1.2 on 2026-10-18 12:43
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bingo', '0012_player_compact_board'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='player',
+            name='layout_seed',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='player',
+            name='board_item_ids',
+            field=models.JSONField(blank=True, default=list),
+        ),
+        migrations.CreateModel(
+            name='BoardSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('include_suggested', models.BooleanField(default=True)),
+                ('version', models.PositiveIntegerField()),
+                ('item_ids', models.JSONField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('board', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='snapshots', to='bingo.bingoboard')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='player',
+            name='layout_snapshot',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.RESTRICT, to='bingo.boardsnapshot'),
+        ),
+        migrations.AddConstraint(
+            model_name='boardsnapshot',
+            constraint=models.UniqueConstraint(fields=('board', 'include_suggested', 'version'), name='unique_snapshot_version_per_board'),
+        ),
+    ]
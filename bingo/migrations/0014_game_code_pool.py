@@ -0,0 +1,38 @@
+# Generated by Django 6.1.2 on 2026-10-18 12:47
+
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def start_cool_down(apps, schema_editor):
+    # When these games ended is unknown, so their codes wait a full cool-down from now
+    BingoGame = apps.get_model('bingo', 'BingoGame')
+    BingoGame.objects.filter(is_active=False).update(ended_at=timezone.now())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bingo', '0013_board_snapshots'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GameCode',
+            fields=[
+                ('code', models.CharField(max_length=6, primary_key=True, serialize=False)),
+                ('rank', models.IntegerField(db_index=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='bingogame',
+            name='ended_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='bingogame',
+            name='code',
+            field=models.CharField(blank=True, max_length=6, null=True, unique=True),
+        ),
+        migrations.RunPython(start_cool_down, migrations.RunPython.noop),
+    ]
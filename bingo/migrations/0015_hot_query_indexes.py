@@ -0,0 +1,33 @@
+# Generated by Django 6.1.2 on 2026-10-18 12:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bingo', '0014_game_code_pool'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='bingoboarditem',
+            index=models.Index(fields=['board', 'text'], name='item_board_text_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='bingoboarditem',
+            index=models.Index(condition=models.Q(('approved__isnull', True), models.Q(('suggested_by', ''), _negated=True)), fields=['created_at'], name='item_pending_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='bingogame',
+            index=models.Index(condition=models.Q(('is_active', True), ('is_private', False)), fields=['-created_at'], name='game_lobby_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='bingogame',
+            index=models.Index(condition=models.Q(('code__isnull', False), ('is_active', False)), fields=['ended_at'], name='game_recyclable_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='gameevent',
+            index=models.Index(fields=['game', '-created_at'], name='event_game_recent_idx'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 6.1.2 on 2026-10-18 12:51
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bingo', '0015_hot_query_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GameSummary',
+            fields=[
+                ('game', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='summary', serialize=False, to='bingo.bingogame')),
+                ('events', models.IntegerField(default=0)),
+                ('first_event_at', models.DateTimeField(blank=True, null=True)),
+                ('last_event_at', models.DateTimeField(blank=True, null=True)),
+                ('marks', models.JSONField(default=dict)),
+                ('timelines', models.JSONField(default=dict)),
+                ('winners', models.JSONField(default=list)),
+                ('compacted_at', models.DateTimeField(blank=True, null=True)),
+                ('compacted_id', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 6.1.2 on 2026-10-18 12:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bingo', '0016_game_summary'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='gameevent',
+            name='event_game_recent_idx',
+        ),
+        migrations.AddIndex(
+            model_name='gameevent',
+            index=models.Index(fields=['game', '-created_at', '-id'], name='event_game_recent_idx'),
+        ),
+    ]
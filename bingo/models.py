@@ -1,9 +1,12 @@
 # models.py
-from django.db import models
-from django.db.models import Q
+from django.db import models, transaction, IntegrityError
+from django.utils import timezone
 from django.contrib.auth.models import AbstractUser
 from django.core.validators import MinLengthValidator
-import random
+from .wincheck import LineTracker, is_win, positions_to_mask, mask_to_positions
+
+# Item id stored in a board layout for the free center square
+FREE_SQUARE = 0
 
 class User(AbstractUser):
     is_administrator = models.BooleanField(default=False)
@@ -42,13 +45,42 @@ class BingoBoardItem(models.Model):
     def __str__(self):
         return self.text
     
-    # class Meta:
-    #     constraints = [
-    #         models.UniqueConstraint(
-    #             fields=['board', 'position'],
-    #             name='unique_position_per_board'
-    #         )
-    #     ]
+    class Meta:
+        # constraints = [
+        #     models.UniqueConstraint(
+        #         fields=['board', 'position'],
+        #         name='unique_position_per_board'
+        #     )
+        # ]
+        indexes = [
+            # Duplicate check when players suggest items
+            models.Index(fields=['board', 'text'], name='item_board_text_idx'),
+            # Suggestions waiting for review
+            models.Index(
+                fields=['created_at'],
+                condition=models.Q(approved__isnull=True) & ~models.Q(suggested_by=''),
+                name='item_pending_idx',
+            ),
+        ]
+
+class BoardSnapshot(models.Model):
+    """The items a board offered at one point, which seeded layouts are drawn from. Never edited."""
+    board = models.ForeignKey(BingoBoard, related_name='snapshots', on_delete=models.CASCADE)
+    include_suggested = models.BooleanField(default=True)
+    version = models.PositiveIntegerField()
+    item_ids = models.JSONField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['board', 'include_suggested', 'version'],
+                name='unique_snapshot_version_per_board',
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.board} v{self.version}"
 
 class BingoGame(models.Model):
     BOARD_SIZE_CHOICES = [
@@ -64,12 +96,14 @@ class BingoGame(models.Model):
     name = models.CharField(max_length=32, null=True, blank=True)
     board = models.ForeignKey(BingoBoard, on_delete=models.CASCADE)
     creator = models.ForeignKey(User, on_delete=models.CASCADE)
-    code = models.CharField(max_length=6, unique=True)
+    # Null once the game has ended long enough ago for its code to be reused
+    code = models.CharField(max_length=6, unique=True, null=True, blank=True)
     has_free_square = models.BooleanField(default=False)
     is_active = models.BooleanField(default=True)
     is_spectateable = models.BooleanField(default=False)
     is_private = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
+    ended_at = models.DateTimeField(null=True, blank=True)
     winner = models.ForeignKey('Player', null=True, blank=True, on_delete=models.SET_NULL, related_name='games_won')
     board_size = models.IntegerField(choices=BOARD_SIZE_CHOICES, default=5)
     win_condition = models.CharField(
@@ -78,28 +112,51 @@ class BingoGame(models.Model):
         default='traditional'
     )
 
-    def generate_code(self):
-        # Generate a random 3-character code
-        chars = 'ABCDEFGHJKLMNPQRSTUVWXYZ'
-        while True:
-            code = ''.join(random.choice(chars) for _ in range(3))
-            if not BingoGame.objects.filter(code=code).exists():
-                return code
-    
+    class Meta:
+        indexes = [
+            # The lobby's list of open games
+            models.Index(
+                fields=['-created_at'],
+                condition=models.Q(is_active=True, is_private=False),
+                name='game_lobby_idx',
+            ),
+            # Ended games whose codes can go back to the pool, see gamecodes.recycle
+            models.Index(
+                fields=['ended_at'],
+                condition=models.Q(is_active=False, code__isnull=False),
+                name='game_recyclable_idx',
+            ),
+        ]
+
     def save(self, *args, **kwargs):
-        if not self.code:
-            self.code = self.generate_code()
-        super().save(*args, **kwargs)
+        if self.is_active:
+            self.ended_at = None
+        elif self.ended_at is None:
+            self.ended_at = timezone.now()
+        if self.code or not (self._state.adding or self.is_active):
+            return super().save(*args, **kwargs)
+        # New, or reopened after its old code went back to the pool
+        from .gamecodes import allocate
+        for attempt in range(3):
+            self.code = allocate()
+            try:
+                with transaction.atomic():
+                    return super().save(*args, **kwargs)
+            except IntegrityError:
+                # Only a refill racing this allocation can hand out a code that is in use
+                if attempt == 2 or not BingoGame.objects.filter(code=self.code).exists():
+                    raise
 
 
     def generate_board_layout(self, use_suggested_items=True):
-        """Generate a randomized board layout based on board size"""
-        if use_suggested_items:
-            items = list(self.board.items.filter(Q(suggested_by='') | Q(approved=True)).values_list('text', flat=True))
-        else:
-            items = list(self.board.items.filter(suggested_by='').values_list('text', flat=True))
-        random.shuffle(items)
-        return items[:(self.board_size * self.board_size)]
+        """A new seeded layout from the board's current snapshot, to assign to Player.layout"""
+        from .layouts import new_layout
+        return new_layout(self.board_id, use_suggested_items)
+
+    async def agenerate_board_layout(self, use_suggested_items=True):
+        """Async version of generate_board_layout for consumers"""
+        from .layouts import anew_layout
+        return await anew_layout(self.board_id, use_suggested_items)
 
     def get_center_position(self):
         """Get the center position based on board size"""
@@ -109,39 +166,30 @@ class BingoGame(models.Model):
 
     def check_win_condition(self, covered_positions):
         """Check if the covered positions constitute a win"""
-        if self.win_condition == 'all':
-            # All squares must be covered
-            return len(covered_positions) == (self.board_size * self.board_size)
-        
-        # Traditional win conditions (lines)
-        size = self.board_size
-        
-        # Generate winning patterns based on board size
-        winning_patterns = []
-        
-        # Rows
-        for i in range(size):
-            winning_patterns.append(list(range(i * size, (i + 1) * size)))
-        
-        # Columns
-        for i in range(size):
-            winning_patterns.append(list(range(i, size * size, size)))
-        
-        # Diagonals
-        winning_patterns.append(list(range(0, size * size, size + 1)))  # Top-left to bottom-right
-        winning_patterns.append(list(range(size - 1, size * (size - 1) + 1, size - 1)))  # Top-right to bottom-left
-        
-        covered_set = set(covered_positions)
+        return is_win(positions_to_mask(covered_positions), self.board_size, self.win_condition)
+
+    def new_line_tracker(self, covered_positions=()):
+        """Incremental win tracker for a player's board in this game"""
+        return LineTracker(self.board_size, self.win_condition, covered_positions)
 
-        return any(all(pos in covered_set for pos in pattern) for pattern in winning_patterns)
+class GameCode(models.Model):
+    """A free game code, see bingo/gamecodes.py"""
+    code = models.CharField(max_length=6, primary_key=True)
+    rank = models.IntegerField(db_index=True)  # random, so codes come out in no particular order
+
+    def __str__(self):
+        return self.code
 
 class Player(models.Model):
     game = models.ForeignKey(BingoGame, related_name='players', on_delete=models.CASCADE)
     name = models.CharField(max_length=50)
-    board_layout = models.JSONField()  # Stores the randomized board positions
-    covered_positions = models.JSONField(default=list)
+    # A seeded layout, see bingo/layouts.py
+    layout_snapshot = models.ForeignKey(BoardSnapshot, null=True, blank=True, on_delete=models.RESTRICT)
+    layout_seed = models.IntegerField(null=True, blank=True)
+    # Boards dealt before seeded layouts: BingoBoardItem ids in board order, FREE_SQUARE for the free square
+    board_item_ids = models.JSONField(default=list, blank=True)
+    covered_mask = models.IntegerField(default=0)  # Bit p is set when position p is covered
     has_won = models.BooleanField(default=False)
-    is_connected = models.BooleanField(default=False)
     last_seen = models.DateTimeField(auto_now=True)
     created_at = models.DateTimeField(auto_now_add=True)
     #preferences
@@ -155,16 +203,73 @@ class Player(models.Model):
     #             name='unique_player_name_per_game'
     #         )
     #     ]
+
+    @property
+    def covered_positions(self) -> list:
+        return mask_to_positions(self.covered_mask)
+
+    @covered_positions.setter
+    def covered_positions(self, positions):
+        self.covered_mask = positions_to_mask(positions)
+
+    @property
+    def layout(self):
+        return (self.layout_snapshot_id, self.layout_seed)
+
+    @layout.setter
+    def layout(self, layout):
+        """Deal a new board from a (snapshot id, seed) pair"""
+        self.layout_snapshot_id, self.layout_seed = layout
+        self.board_item_ids = []
+
+    @property
+    def item_ids(self) -> list:
+        """The board's squares as item ids. May query, so async code should use PlayerSession."""
+        from .layouts import player_item_ids
+        return player_item_ids(self)
+
+    @property
+    def board_layout(self) -> list:
+        """The board's square texts. May query, so async code should use PlayerSession.texts."""
+        from .itemtable import item_tables
+        item_ids = self.item_ids
+        return item_tables.get(self.game.board_id, item_ids).texts(item_ids)
+
+    def is_covered(self, position: int) -> bool:
+        return bool(self.covered_mask >> position & 1)
         
 
 class GameEvent(models.Model):
     game = models.ForeignKey(BingoGame, related_name='events', on_delete=models.CASCADE)
     player = models.ForeignKey(Player, related_name='events', on_delete=models.CASCADE)
     message = models.CharField(max_length=255)
-    created_at = models.DateTimeField(auto_now_add=True)
+    # Not auto_now_add: queued events keep the time they happened, not the time they were saved
+    created_at = models.DateTimeField(default=timezone.now)
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # A game's events newest first, optionally since some time or before a (created_at, id) cursor
+            models.Index(fields=['game', '-created_at', '-id'], name='event_game_recent_idx'),
+        ]
+
+
+class GameSummary(models.Model):
+    """What is left of a game's events once they are compacted, see bingo/retention.py"""
+    game = models.OneToOneField(BingoGame, primary_key=True, related_name='summary', on_delete=models.CASCADE)
+    events = models.IntegerField(default=0)
+    first_event_at = models.DateTimeField(null=True, blank=True)
+    last_event_at = models.DateTimeField(null=True, blank=True)
+    marks = models.JSONField(default=dict)      # item text -> times marked
+    timelines = models.JSONField(default=dict)  # player id -> name, counts and events per minute of the game
+    winners = models.JSONField(default=list)    # {'player_id', 'name', 'at'} in the order they won
+    # Events up to and including (compacted_at, compacted_id) are folded in
+    compacted_at = models.DateTimeField(null=True, blank=True)
+    compacted_id = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Summary of {self.game.code or self.game_id}"
 
 
 class Feedback(models.Model):
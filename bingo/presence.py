@@ -0,0 +1,205 @@
+# bingo/presence.py
+"""Who is connected to which game.
+
+Each game has a sorted set of connections scored by their last heartbeat.
+Entries older than the TTL count as gone, so a worker that dies without
+running ``disconnect`` can't leave players online forever.
+
+A connection is stored as ``<player_id>:<channel_name>`` so a player with two
+tabs open stays online until both are closed. Player names live in a hash
+next to the set so listings don't need the database.
+"""
+import time
+import threading
+from django.conf import settings
+from . import redisconn
+
+DEFAULTS = {
+    'BACKEND': None,   # 'redis' or 'local'; defaults to redis when the channel layer uses it
+    'TTL': 60,         # seconds without a heartbeat before a connection expires
+    'HEARTBEAT': 20,   # seconds between consumer heartbeats
+}
+
+
+def _config(key):
+    return getattr(settings, 'PRESENCE', {}).get(key, DEFAULTS[key])
+
+
+def _member(player_id, channel_name):
+    return f'{player_id}:{channel_name}'
+
+
+def _player_id(member):
+    if isinstance(member, bytes):
+        member = member.decode()
+    return int(member.split(':', 1)[0])
+
+
+class LocalPresence:
+    """Single-process presence for development and Redis-less deployments"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._games = {}   # game code -> {member: last heartbeat}
+        self._names = {}   # game code -> {player id: name}
+
+    async def join(self, game_code, player_id, channel_name, name):
+        with self._lock:
+            self._games.setdefault(game_code, {})[_member(player_id, channel_name)] = time.time()
+            self._names.setdefault(game_code, {})[player_id] = name
+
+    async def heartbeat(self, game_code, player_id, channel_name):
+        with self._lock:
+            self._games.setdefault(game_code, {})[_member(player_id, channel_name)] = time.time()
+
+    async def rename(self, game_code, player_id, name):
+        with self._lock:
+            self._names.setdefault(game_code, {})[player_id] = name
+
+    async def leave(self, game_code, player_id, channel_name):
+        with self._lock:
+            self._games.get(game_code, {}).pop(_member(player_id, channel_name), None)
+
+    async def connected(self, game_code) -> dict:
+        return self.connected_sync(game_code)
+
+    def connected_sync(self, game_code) -> dict:
+        cutoff = time.time() - _config('TTL')
+        with self._lock:
+            members = self._games.get(game_code, {})
+            for member in [m for m, seen in members.items() if seen < cutoff]:
+                del members[member]
+            names = self._names.get(game_code, {})
+            return {
+                player_id: names.get(player_id, '')
+                for player_id in sorted({_player_id(m) for m in members})
+            }
+
+
+class RedisPresence:
+    """Presence stored on the Redis instance the channel layer already uses"""
+
+    def __init__(self):
+        self._async_client = None
+        self._sync_client = None
+
+    @property
+    def client(self):
+        if self._async_client is None:
+            import redis.asyncio
+            self._async_client = redisconn.connect(redis.asyncio)
+        return self._async_client
+
+    @property
+    def sync_client(self):
+        """Blocking client for admin pages and other code outside the event loop"""
+        if self._sync_client is None:
+            import redis
+            self._sync_client = redisconn.connect(redis)
+        return self._sync_client
+
+    def _keys(self, game_code):
+        return f'presence:{game_code}', f'presence:{game_code}:names'
+
+    async def join(self, game_code, player_id, channel_name, name):
+        key, names_key = self._keys(game_code)
+        ttl = _config('TTL')
+        async with self.client.pipeline(transaction=False) as pipe:
+            pipe.zadd(key, {_member(player_id, channel_name): time.time()})
+            pipe.hset(names_key, player_id, name)
+            # Abandoned games clean themselves up
+            pipe.expire(key, ttl * 2)
+            pipe.expire(names_key, ttl * 2)
+            await pipe.execute()
+
+    async def heartbeat(self, game_code, player_id, channel_name):
+        key, names_key = self._keys(game_code)
+        ttl = _config('TTL')
+        async with self.client.pipeline(transaction=False) as pipe:
+            pipe.zadd(key, {_member(player_id, channel_name): time.time()})
+            pipe.expire(key, ttl * 2)
+            pipe.expire(names_key, ttl * 2)
+            await pipe.execute()
+
+    async def rename(self, game_code, player_id, name):
+        await self.client.hset(self._keys(game_code)[1], player_id, name)
+
+    async def leave(self, game_code, player_id, channel_name):
+        await self.client.zrem(self._keys(game_code)[0], _member(player_id, channel_name))
+
+    async def connected(self, game_code) -> dict:
+        key, names_key = self._keys(game_code)
+        now = time.time()
+        async with self.client.pipeline(transaction=False) as pipe:
+            pipe.zremrangebyscore(key, '-inf', now - _config('TTL'))
+            pipe.zrange(key, 0, -1)
+            _, members = await pipe.execute()
+        player_ids = sorted({_player_id(m) for m in members})
+        if not player_ids:
+            return {}
+        names = await self.client.hmget(names_key, player_ids)
+        return self._with_names(player_ids, names)
+
+    def connected_sync(self, game_code) -> dict:
+        key, names_key = self._keys(game_code)
+        with self.sync_client.pipeline(transaction=False) as pipe:
+            pipe.zremrangebyscore(key, '-inf', time.time() - _config('TTL'))
+            pipe.zrange(key, 0, -1)
+            _, members = pipe.execute()
+        player_ids = sorted({_player_id(m) for m in members})
+        if not player_ids:
+            return {}
+        return self._with_names(player_ids, self.sync_client.hmget(names_key, player_ids))
+
+    @staticmethod
+    def _with_names(player_ids, names):
+        return {
+            player_id: (name.decode() if name else '')
+            for player_id, name in zip(player_ids, names)
+        }
+
+
+def _create_backend():
+    backend = _config('BACKEND')
+    if backend is None:
+        backend = 'redis' if redisconn.layer_uses_redis() else 'local'
+    return RedisPresence() if backend == 'redis' else LocalPresence()
+
+
+class Presence:
+    """Lazily configured facade over the presence backend"""
+
+    def __init__(self):
+        self._backend = None
+
+    @property
+    def backend(self):
+        if self._backend is None:
+            self._backend = _create_backend()
+        return self._backend
+
+    @property
+    def heartbeat_interval(self):
+        return _config('HEARTBEAT')
+
+    async def join(self, game_code, player_id, channel_name, name):
+        await self.backend.join(game_code, player_id, channel_name, name)
+
+    async def heartbeat(self, game_code, player_id, channel_name):
+        await self.backend.heartbeat(game_code, player_id, channel_name)
+
+    async def rename(self, game_code, player_id, name):
+        await self.backend.rename(game_code, player_id, name)
+
+    async def leave(self, game_code, player_id, channel_name):
+        await self.backend.leave(game_code, player_id, channel_name)
+
+    async def connected(self, game_code) -> dict:
+        """Connected players of a game as ``{player_id: name}``"""
+        return await self.backend.connected(game_code)
+
+    def connected_sync(self, game_code) -> dict:
+        return self.backend.connected_sync(game_code)
+
+
+presence = Presence()
@@ -0,0 +1,84 @@
+# bingo/protocol.py
+"""Compact JSON deltas, an opt-in alternative to HTML over the socket.
+
+A client asks for them by offering the ``bingo.delta.v1`` WebSocket
+subprotocol. Every delta is one JSON object tagged by ``t``:
+
+    {"t":"m","p":12,"c":1}                              square 12 is now covered
+    {"t":"e","n":"Jo","m":"...","ts":...,"w":0,"r":90,"q":7}  event number q, removed after r seconds
+    {"t":"b","s":5,"i":[...],"c":[...],"f":12}          a whole new board
+    {"t":"s","a":1,"w":0,"x":null,"c":[...],"p":[...],"q":7}  game state as of event number q
+    {"t":"x","k":"mark_position","r":1.5}               messages of type k are being dropped; retry in r seconds
+
+Anything else the server sends, like modals and forms, is still an HTML
+fragment for htmx to swap.
+"""
+import json
+from django.conf import settings
+
+DELTA_SUBPROTOCOL = 'bingo.delta.v1'
+PROTOCOLS = ('html', 'delta')
+
+
+def _dumps(message: dict) -> str:
+    return json.dumps(message, separators=(',', ':'), ensure_ascii=False)
+
+
+def negotiate(scope) -> str:
+    """The subprotocol to accept for a connection, or None for HTML"""
+    if DELTA_SUBPROTOCOL in scope.get('subprotocols', ()):
+        return DELTA_SUBPROTOCOL
+    return None
+
+
+def requested_protocol(request) -> str:
+    """Which protocol a page should ask for: ``?proto=`` or the WEBSOCKET_PROTOCOL setting"""
+    protocol = request.GET.get('proto') or getattr(settings, 'WEBSOCKET_PROTOCOL', 'html')
+    return protocol if protocol in PROTOCOLS else 'html'
+
+
+def mark(position: int, covered: bool) -> str:
+    return _dumps({'t': 'm', 'p': position, 'c': int(covered)})
+
+
+def event(game_event: dict, remove_in: int = 0) -> str:
+    message = {
+        't': 'e',
+        'n': game_event['player'],
+        'm': game_event['message'],
+        'ts': int(game_event['created_at']),
+        'w': int("BINGO" in game_event['message']),
+    }
+    if remove_in:
+        message['r'] = remove_in
+    if game_event.get('seq'):
+        message['q'] = game_event['seq']
+    return _dumps(message)
+
+
+def board(player, game, board_items) -> str:
+    # Same rule the cell template uses
+    free = 12 if game.has_free_square and game.board_size == 5 else None
+    return _dumps({
+        't': 'b',
+        's': game.board_size,
+        'i': list(board_items),
+        'c': list(player.covered_positions),
+        'f': free,
+    })
+
+
+def state(game_state: dict) -> str:
+    return _dumps({
+        't': 's',
+        'a': int(game_state['is_active']),
+        'w': int(game_state['has_won']),
+        'x': game_state['winner'],
+        'c': game_state['covered_positions'],
+        'p': game_state['connected_players'],
+        'q': game_state['seq'],
+    })
+
+
+def throttled(message_type, retry_after: float) -> str:
+    return _dumps({'t': 'x', 'k': message_type, 'r': round(retry_after, 2)})
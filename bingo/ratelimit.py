@@ -0,0 +1,139 @@
+# bingo/ratelimit.py
+"""Token buckets for messages players send over their game socket.
+
+Every message type has a bucket per connection and one per game, so one
+noisy client is slowed down first, and a whole game can't flood the
+process either. Messages over the limit are dropped rather than queued.
+The consumer tells the client it is being throttled.
+
+Buckets and counters are per process, like the consumers they protect.
+"""
+import threading
+import time
+from collections import defaultdict
+from django.conf import settings
+
+DEFAULTS = {
+    'ENABLED': True,
+    # message type -> (tokens per second, burst); '*' covers every other type
+    'CONNECTION': {
+        'mark_position': (8, 16),
+        'request_state': (1, 3),
+        'clear_board': (0.2, 2),
+        'abandon_board': (0.2, 2),
+        'submit_suggestions': (0.1, 2),
+        'submit_feedback': (0.1, 2),
+        'change_name': (0.2, 3),
+        '*': (2, 10),
+    },
+    'GAME': {
+        'mark_position': (200, 400),
+        'submit_suggestions': (1, 10),
+        'submit_feedback': (1, 10),
+        '*': (50, 100),
+    },
+}
+
+
+class TokenBucket:
+    __slots__ = ('rate', 'capacity', 'tokens', 'updated')
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def take(self, now=None) -> bool:
+        """Spend a token if there is one"""
+        self._refill(now or time.monotonic())
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+    def retry_after(self) -> float:
+        """Seconds until the next token"""
+        return max(0.0, (1 - self.tokens) / self.rate)
+
+
+class RateLimiter:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._games = {}   # game code -> [local connections, {limit key: TokenBucket}]
+        self._counters = defaultdict(lambda: {'allowed': 0, 'throttled_connection': 0, 'throttled_game': 0})
+
+    def _config(self, key):
+        return getattr(settings, 'RATE_LIMITS', {}).get(key, DEFAULTS[key])
+
+    @property
+    def enabled(self) -> bool:
+        return self._config('ENABLED')
+
+    def _limit(self, scope, message_type):
+        """The configured key and limit for a message type"""
+        limits = self._config(scope)
+        key = message_type if message_type in limits else '*'
+        return key, limits.get(key)
+
+    def join(self, game_code):
+        with self._lock:
+            self._games.setdefault(game_code, [0, {}])[0] += 1
+
+    def leave(self, game_code):
+        with self._lock:
+            game = self._games.get(game_code)
+            if game:
+                game[0] -= 1
+                if game[0] <= 0:
+                    del self._games[game_code]
+
+    def check(self, buckets: dict, game_code, message_type):
+        """Spend a token for a message and return None, or return seconds to wait.
+
+        ``buckets`` is the connection's own dict of buckets, kept by the consumer.
+        """
+        now = time.monotonic()
+        key, limit = self._limit('CONNECTION', message_type)
+        if limit:
+            bucket = buckets.get(key)
+            if bucket is None:
+                bucket = buckets[key] = TokenBucket(*limit)
+            if not bucket.take(now):
+                self._count(key, 'throttled_connection')
+                return bucket.retry_after()
+
+        game_key, limit = self._limit('GAME', message_type)
+        if limit:
+            with self._lock:
+                game_buckets = self._games.setdefault(game_code, [0, {}])[1]
+                bucket = game_buckets.get(game_key)
+                if bucket is None:
+                    bucket = game_buckets[game_key] = TokenBucket(*limit)
+                retry_after = None if bucket.take(now) else bucket.retry_after()
+            # Counted outside the lock, _count takes it too
+            if retry_after is not None:
+                self._count(key, 'throttled_game')
+                return retry_after
+
+        self._count(key, 'allowed')
+        return None
+
+    def _count(self, key, outcome):
+        with self._lock:
+            self._counters[key][outcome] += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'enabled': self.enabled,
+                'games': len(self._games),
+                'message_types': {key: dict(counts) for key, counts in self._counters.items()},
+            }
+
+
+rate_limiter = RateLimiter()
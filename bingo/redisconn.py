@@ -0,0 +1,28 @@
+# bingo/redisconn.py
+"""Connections to the Redis instance the channel layer already uses"""
+from django.conf import settings
+
+
+def layer_uses_redis() -> bool:
+    layer = settings.CHANNEL_LAYERS.get('default', {})
+    backend = layer.get('BACKEND', '')
+    if backend.startswith('channels_redis'):
+        return True
+    return backend == 'bingo.layers.HybridChannelLayer' and bool(layer.get('CONFIG', {}).get('hosts'))
+
+
+def connection_kwargs() -> dict:
+    host = settings.CHANNEL_LAYERS['default'].get('CONFIG', {}).get('hosts', [('127.0.0.1', 6379)])[0]
+    if isinstance(host, str):
+        return {'url': host}
+    if isinstance(host, dict):
+        return dict(host)
+    return {'host': host[0], 'port': host[1]}
+
+
+def connect(redis_module):
+    """A client from ``redis`` or ``redis.asyncio`` for the channel layer's first host"""
+    kwargs = connection_kwargs()
+    if 'url' in kwargs:
+        return redis_module.Redis.from_url(kwargs.pop('url'), **kwargs)
+    return redis_module.Redis(**kwargs)
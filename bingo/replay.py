@@ -0,0 +1,361 @@
+# bingo/replay.py
+"""Recent history per game, so a reconnecting client can catch up.
+
+Every game event and every change to a player's board takes the next
+number from the game's sequence. Events are kept in a bounded buffer per
+game, and board changes in a bounded buffer per player. A client that
+reconnects with the last sequence number it saw gets exactly what it
+missed. If the buffers no longer reach back that far, ``since`` returns
+None and the caller sends the full state instead.
+
+The event buffer doubles as the game's recent timeline for page loads
+(see bingo/timeline.py). Until it is seeded, e.g. after a restart or once
+an idle game's history expired, it is *cold*, even if new events were
+appended since. ``seed`` puts the events from the database in front of
+those, with sequence number 0, so they show on pages but are never
+replayed.
+"""
+import json
+import threading
+import time
+from collections import deque
+from django.conf import settings
+from . import redisconn
+
+DEFAULTS = {
+    'BACKEND': None,   # 'redis' or 'local'; defaults to redis when the channel layer uses it
+    'EVENTS': 200,     # events kept per game
+    'CELLS': 100,      # board changes kept per player
+    'TTL': 3600,       # seconds an idle game's history is kept
+}
+
+# A board change that replaced the whole board rather than one square
+BOARD = -1
+
+
+def _config(key):
+    return getattr(settings, 'REPLAY', {}).get(key, DEFAULTS[key])
+
+
+class Missed:
+    """What a client missed: events in order, squares that changed, and whether the board was replaced"""
+    __slots__ = ('events', 'positions', 'board')
+
+    def __init__(self, events, positions, board):
+        self.events = events
+        self.positions = positions
+        self.board = board
+
+
+def _missed(current, last_seq, events, cells):
+    """Work out a Missed from ``(seq, value)`` lists, or None if there is a gap"""
+    if last_seq > current:
+        # The sequence was reset, so the client's number means nothing now
+        return None
+    if len(events) >= _config('EVENTS') and events[0][0] > last_seq + 1:
+        return None
+    board = len(cells) >= _config('CELLS') and cells[0][0] > last_seq + 1
+    positions = []
+    for seq, position in cells:
+        if seq <= last_seq:
+            continue
+        if position == BOARD:
+            board = True
+        elif position not in positions:
+            positions.append(position)
+    events = [dict(event, seq=seq) for seq, event in events if seq > last_seq]
+    return Missed(events, positions, board)
+
+
+def _older(events, first):
+    """The stored events from before the first buffered one, which the database may already hold too"""
+    if first is None:
+        return events
+    return [event for event in events if event['created_at'] < first['created_at']]
+
+
+class LocalReplay:
+    """Single-process history for development and Redis-less deployments"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._seq = {}      # game code -> last sequence number
+        self._events = {}   # game code -> deque of (seq, event)
+        self._cells = {}    # (game code, player id) -> deque of (seq, position)
+        self._touched = {}  # game code -> time of the last append
+        self._seeded = set()  # game codes whose event buffer holds the database's history
+        self._pruned = time.monotonic()
+
+    def _next(self, game_code):
+        seq = self._seq.get(game_code, 0) + 1
+        self._seq[game_code] = seq
+        self._touched[game_code] = time.monotonic()
+        self._prune()
+        return seq
+
+    def _prune(self):
+        now = time.monotonic()
+        if now - self._pruned < 60:
+            return
+        self._pruned = now
+        cutoff = now - _config('TTL')
+        for game_code in [code for code, touched in self._touched.items() if touched < cutoff]:
+            del self._touched[game_code]
+            self._seeded.discard(game_code)
+            self._seq.pop(game_code, None)
+            self._events.pop(game_code, None)
+            for key in [key for key in self._cells if key[0] == game_code]:
+                del self._cells[key]
+
+    async def append_event(self, game_code, event) -> int:
+        with self._lock:
+            seq = self._next(game_code)
+            self._events.setdefault(game_code, deque(maxlen=_config('EVENTS'))).append((seq, event))
+            return seq
+
+    async def append_cell(self, game_code, player_id, position) -> int:
+        with self._lock:
+            seq = self._next(game_code)
+            self._cells.setdefault((game_code, player_id), deque(maxlen=_config('CELLS'))).append((seq, position))
+            return seq
+
+    async def current(self, game_code) -> int:
+        return self.current_sync(game_code)
+
+    def current_sync(self, game_code) -> int:
+        with self._lock:
+            return self._seq.get(game_code, 0)
+
+    async def since(self, game_code, player_id, last_seq):
+        with self._lock:
+            return _missed(
+                self._seq.get(game_code, 0),
+                last_seq,
+                list(self._events.get(game_code, ())),
+                list(self._cells.get((game_code, player_id), ())),
+            )
+
+    async def recent(self, game_code):
+        return self.recent_sync(game_code)
+
+    def recent_sync(self, game_code):
+        with self._lock:
+            if game_code not in self._seeded:
+                return None
+            return self._seq.get(game_code, 0), list(self._events.get(game_code, ()))
+
+    async def seed(self, game_code, events):
+        self.seed_sync(game_code, events)
+
+    def seed_sync(self, game_code, events):
+        with self._lock:
+            if game_code in self._seeded:
+                return
+            buffered = list(self._events.get(game_code, ()))
+            older = _older(events, buffered[0][1] if buffered else None)
+            self._seq.setdefault(game_code, 0)
+            self._touched[game_code] = time.monotonic()
+            self._events[game_code] = deque([(0, event) for event in older] + buffered, maxlen=_config('EVENTS'))
+            self._seeded.add(game_code)
+
+
+# Bump the sequence and append to a capped list in one round trip
+APPEND_SCRIPT = """
+local seq = redis.call('INCR', KEYS[1])
+redis.call('RPUSH', KEYS[2], seq .. '|' .. ARGV[1])
+redis.call('LTRIM', KEYS[2], -tonumber(ARGV[2]), -1)
+redis.call('EXPIRE', KEYS[1], ARGV[3])
+redis.call('EXPIRE', KEYS[2], ARGV[3])
+return seq
+"""
+
+# Put stored events in front of a cold game's buffer, newest first, skipping
+# any not older than the first buffered event. ARGV: TTL, EVENTS, then
+# (created_at, entry) pairs oldest first.
+SEED_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 1 then return 0 end
+local first = redis.call('LINDEX', KEYS[2], 0)
+local before = nil
+if first then
+    before = cjson.decode(string.sub(first, string.find(first, '|', 1, true) + 1)).created_at
+end
+for i = #ARGV - 1, 3, -2 do
+    if before == nil or tonumber(ARGV[i]) < before then
+        redis.call('LPUSH', KEYS[2], ARGV[i + 1])
+    end
+end
+redis.call('LTRIM', KEYS[2], -tonumber(ARGV[2]), -1)
+redis.call('EXPIRE', KEYS[2], ARGV[1])
+redis.call('SET', KEYS[1], 1, 'EX', ARGV[1])
+return 1
+"""
+
+
+def _entries(raw, decode):
+    entries = []
+    for entry in raw:
+        seq, value = entry.decode().split('|', 1)
+        entries.append((int(seq), decode(value)))
+    return entries
+
+
+class RedisReplay:
+    """History stored on the Redis instance the channel layer already uses"""
+
+    def __init__(self):
+        self._async_client = None
+        self._sync_client = None
+        self._append = None
+        self._seed = None
+        self._seed_sync = None
+
+    @property
+    def client(self):
+        if self._async_client is None:
+            import redis.asyncio
+            self._async_client = redisconn.connect(redis.asyncio)
+        return self._async_client
+
+    @property
+    def append_script(self):
+        if self._append is None:
+            self._append = self.client.register_script(APPEND_SCRIPT)
+        return self._append
+
+    @property
+    def sync_client(self):
+        if self._sync_client is None:
+            import redis
+            self._sync_client = redisconn.connect(redis)
+        return self._sync_client
+
+    def _seq_key(self, game_code):
+        return f'replay:{game_code}:seq'
+
+    def _events_key(self, game_code):
+        return f'replay:{game_code}:events'
+
+    def _seeded_key(self, game_code):
+        return f'replay:{game_code}:seeded'
+
+    def _cells_key(self, game_code, player_id):
+        return f'replay:{game_code}:cells:{player_id}'
+
+    async def append_event(self, game_code, event) -> int:
+        return await self.append_script(
+            keys=[self._seq_key(game_code), self._events_key(game_code)],
+            args=[json.dumps(event, separators=(',', ':')), _config('EVENTS'), _config('TTL')],
+        )
+
+    async def append_cell(self, game_code, player_id, position) -> int:
+        return await self.append_script(
+            keys=[self._seq_key(game_code), self._cells_key(game_code, player_id)],
+            args=[position, _config('CELLS'), _config('TTL')],
+        )
+
+    async def current(self, game_code) -> int:
+        return int(await self.client.get(self._seq_key(game_code)) or 0)
+
+    def current_sync(self, game_code) -> int:
+        return int(self.sync_client.get(self._seq_key(game_code)) or 0)
+
+    async def since(self, game_code, player_id, last_seq):
+        async with self.client.pipeline(transaction=True) as pipe:
+            pipe.get(self._seq_key(game_code))
+            pipe.lrange(self._events_key(game_code), 0, -1)
+            pipe.lrange(self._cells_key(game_code, player_id), 0, -1)
+            current, events, cells = await pipe.execute()
+        return _missed(int(current or 0), last_seq, _entries(events, json.loads), _entries(cells, int))
+
+    def _queue_recent(self, pipe, game_code):
+        pipe.exists(self._seeded_key(game_code))
+        pipe.get(self._seq_key(game_code))
+        pipe.lrange(self._events_key(game_code), 0, -1)
+
+    @staticmethod
+    def _recent(seeded, current, events):
+        if not seeded:
+            return None
+        return int(current or 0), _entries(events, json.loads)
+
+    async def recent(self, game_code):
+        async with self.client.pipeline(transaction=True) as pipe:
+            self._queue_recent(pipe, game_code)
+            return self._recent(*await pipe.execute())
+
+    def recent_sync(self, game_code):
+        with self.sync_client.pipeline(transaction=True) as pipe:
+            self._queue_recent(pipe, game_code)
+            return self._recent(*pipe.execute())
+
+    def _seed_args(self, game_code, events):
+        keys = [self._seeded_key(game_code), self._events_key(game_code)]
+        args = [_config('TTL'), _config('EVENTS')]
+        for event in events:
+            args += [repr(event['created_at']), f"0|{json.dumps(event, separators=(',', ':'))}"]
+        return {'keys': keys, 'args': args}
+
+    async def seed(self, game_code, events):
+        if self._seed is None:
+            self._seed = self.client.register_script(SEED_SCRIPT)
+        await self._seed(**self._seed_args(game_code, events))
+
+    def seed_sync(self, game_code, events):
+        if self._seed_sync is None:
+            self._seed_sync = self.sync_client.register_script(SEED_SCRIPT)
+        self._seed_sync(**self._seed_args(game_code, events))
+
+
+def _create_backend():
+    backend = _config('BACKEND')
+    if backend is None:
+        backend = 'redis' if redisconn.layer_uses_redis() else 'local'
+    return RedisReplay() if backend == 'redis' else LocalReplay()
+
+
+class Replay:
+    """Lazily configured facade over the replay backend"""
+
+    def __init__(self):
+        self._backend = None
+
+    @property
+    def backend(self):
+        if self._backend is None:
+            self._backend = _create_backend()
+        return self._backend
+
+    async def append_event(self, game_code, event: dict) -> int:
+        """Record an event and return its sequence number"""
+        return await self.backend.append_event(game_code, event)
+
+    async def append_cell(self, game_code, player_id, position) -> int:
+        """Record a change to one square, or to the whole board with BOARD"""
+        return await self.backend.append_cell(game_code, player_id, position)
+
+    async def current(self, game_code) -> int:
+        return await self.backend.current(game_code)
+
+    def current_sync(self, game_code) -> int:
+        return self.backend.current_sync(game_code)
+
+    async def since(self, game_code, player_id, last_seq):
+        """What a player missed after ``last_seq``, or None if it is no longer all there"""
+        return await self.backend.since(game_code, player_id, last_seq)
+
+    async def recent(self, game_code):
+        """The current sequence number and buffered ``(seq, event)`` pairs oldest first, or None until seeded"""
+        return await self.backend.recent(game_code)
+
+    def recent_sync(self, game_code):
+        return self.backend.recent_sync(game_code)
+
+    async def seed(self, game_code, events):
+        """Put earlier events, oldest first, in front of a cold game's buffer and mark it seeded"""
+        await self.backend.seed(game_code, events)
+
+    def seed_sync(self, game_code, events):
+        self.backend.seed_sync(game_code, events)
+
+
+replay = Replay()
@@ -0,0 +1,168 @@
+# bingo/retention.py
+"""Compacting and purging GameEvents.
+
+Raw events are only needed while people might still scroll back through
+them. Once a game has ended, or once events get old, they are folded into
+the game's GameSummary: how often each item was marked, when each player
+was active and who won. The raw rows can then be purged once they are
+older than KEEP_RAW.
+
+All work happens in small batches, each in its own short transaction, so
+SQLite is never write-locked for long. Each summary records the last event
+it folded in, so an interrupted run simply carries on where it stopped.
+"""
+import logging
+import re
+import time
+from datetime import timedelta
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Max, Q
+from django.utils import timezone
+from .models import BingoGame, GameEvent, GameSummary
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'COMPACT_AFTER': 24 * 3600,     # seconds after a game ends before all its events are compacted
+    'KEEP_RAW': 30 * 24 * 3600,     # seconds raw events are kept; older ones are compacted, then purged
+    'BATCH_SIZE': 500,              # events read or deleted per transaction
+    'PAUSE': 0.05,                  # seconds between batches, so other writers get a turn
+}
+
+# "<name> marked 'a', 'b' and unmarked 'c'", as written by the consumer and the coalescer
+MARKS = re.compile(r" marked ('.*?')(?: and unmarked ('.*'))?$| unmarked ('.*')$")
+
+
+def _config(key):
+    return getattr(settings, 'GAME_EVENT_RETENTION', {}).get(key, DEFAULTS[key])
+
+
+def _texts(quoted):
+    return quoted[1:-1].split("', '") if quoted else []
+
+
+def parse_marks(message) -> tuple:
+    """The item texts an event marked and unmarked"""
+    match = MARKS.search(message)
+    if match is None:
+        return [], []
+    marked, unmarked, only_unmarked = match.groups()
+    return _texts(marked), _texts(unmarked or only_unmarked)
+
+
+def _millis(at) -> float:
+    return at.timestamp() * 1000
+
+
+def _fold(summary, game, rows):
+    for event_id, created_at, player_id, player_name, message in rows:
+        summary.events += 1
+        summary.first_event_at = summary.first_event_at or created_at
+        summary.last_event_at = created_at
+        marked, unmarked = parse_marks(message)
+        for text in marked:
+            summary.marks[text] = summary.marks.get(text, 0) + 1
+
+        timeline = summary.timelines.setdefault(str(player_id), {
+            'name': player_name, 'first': _millis(created_at), 'events': 0, 'marked': 0, 'unmarked': 0,
+            'bingo': None, 'minutes': {},
+        })
+        timeline['last'] = _millis(created_at)
+        timeline['events'] += 1
+        timeline['marked'] += len(marked)
+        timeline['unmarked'] += len(unmarked)
+        minute = str(int((created_at - game.created_at).total_seconds() // 60))
+        timeline['minutes'][minute] = timeline['minutes'].get(minute, 0) + 1
+
+        if 'BINGO' in message and timeline['bingo'] is None:
+            timeline['bingo'] = _millis(created_at)
+            summary.winners.append({'player_id': player_id, 'name': player_name, 'at': _millis(created_at)})
+        summary.compacted_at, summary.compacted_id = created_at, event_id
+
+
+def _horizon(game, now):
+    """Events before this may be compacted"""
+    if not game.is_active and game.ended_at and game.ended_at <= now - timedelta(seconds=_config('COMPACT_AFTER')):
+        return now
+    return now - timedelta(seconds=_config('KEEP_RAW'))
+
+
+def compact_game(game, now=None) -> int:
+    """Fold a game's events that are old enough into its summary. Returns how many were folded."""
+    now = now or timezone.now()
+    horizon = _horizon(game, now)
+    summary, _ = GameSummary.objects.get_or_create(game=game)
+    batch_size = _config('BATCH_SIZE')
+    folded = 0
+    while True:
+        events = GameEvent.objects.filter(game=game, created_at__lt=horizon)
+        if summary.compacted_at:
+            events = events.filter(
+                Q(created_at__gt=summary.compacted_at) | Q(created_at=summary.compacted_at, id__gt=summary.compacted_id)
+            )
+        rows = list(
+            events.order_by('created_at', 'id')
+            .values_list('id', 'created_at', 'player_id', 'player__name', 'message')[:batch_size]
+        )
+        if not rows:
+            return folded
+        _fold(summary, game, rows)
+        with transaction.atomic():
+            summary.save()
+        folded += len(rows)
+        if len(rows) < batch_size:
+            return folded
+        time.sleep(_config('PAUSE'))
+
+
+def games_to_compact(now=None):
+    """Games with events that are not folded into their summary yet"""
+    now = now or timezone.now()
+    ended = now - timedelta(seconds=_config('COMPACT_AFTER'))
+    raw_cutoff = now - timedelta(seconds=_config('KEEP_RAW'))
+    # Max runs over the rows the filter joined: every event of a finished game, only old ones otherwise
+    return (
+        BingoGame.objects
+        .filter(Q(is_active=False, ended_at__lte=ended) | Q(events__created_at__lt=raw_cutoff))
+        .annotate(latest_event_at=Max('events__created_at'))
+        .filter(latest_event_at__isnull=False)
+        .exclude(summary__compacted_at__gte=F('latest_event_at'))
+        .order_by('id')
+    )
+
+
+def compact(now=None, limit=None) -> int:
+    """Compact every game that has something to compact. Returns events folded."""
+    now = now or timezone.now()
+    games = games_to_compact(now)
+    if limit:
+        games = games[:limit]
+    folded = 0
+    for game in games:
+        count = compact_game(game, now)
+        if count:
+            logger.info(f"Compacted {count} events of game {game.id}")
+        folded += count
+    return folded
+
+
+def purge(now=None) -> int:
+    """Delete raw events older than KEEP_RAW that are already in a summary. Returns rows deleted."""
+    now = now or timezone.now()
+    cutoff = now - timedelta(seconds=_config('KEEP_RAW'))
+    batch_size = _config('BATCH_SIZE')
+    folded = Q(game__summary__compacted_at__gt=F('created_at')) | Q(
+        game__summary__compacted_at=F('created_at'), id__lte=F('game__summary__compacted_id'),
+    )
+    deleted = 0
+    while True:
+        ids = list(GameEvent.objects.filter(folded, created_at__lt=cutoff).values_list('id', flat=True)[:batch_size])
+        if not ids:
+            return deleted
+        with transaction.atomic():
+            count, _ = GameEvent.objects.filter(id__in=ids).delete()
+        deleted += count
+        if len(ids) < batch_size:
+            return deleted
+        time.sleep(_config('PAUSE'))
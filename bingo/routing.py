@@ -5,5 +5,6 @@ from . import consumers
 websocket_urlpatterns = [
     path(r'ws/play/<int:player_id>/', consumers.BingoGameConsumer.as_asgi()),
     path(r'ws/spectate/<str:game_code>/', consumers.SpectatorConsumer.as_asgi()),
+    path(r'ws/lobby/', consumers.LobbyConsumer.as_asgi()),
     # path(r'ws/event/', consumers.EventConsumer.as_asgi()),
 ]
\ No newline at end of file
@@ -0,0 +1,86 @@
+# bingo/session.py
+import logging
+from .models import Player
+from .writebehind import coverage_buffer
+from .itemtable import item_tables
+from .layouts import aplayer_item_ids
+from .groups import group_send_sync
+
+logger = logging.getLogger(__name__)
+
+
+class PlayerSession:
+    """Authoritative in-memory copy of a connected player and their game.
+
+    Loaded once when the socket connects and kept current write-through by the
+    consumer. It is only reloaded from the database when a ``session_invalidate``
+    message arrives over the game group.
+    """
+
+    def __init__(self, player: Player, item_ids, items):
+        self.player = player
+        self.game = player.game
+        self.item_ids = item_ids  # the player's squares
+        self.items = items  # ItemTable of the game's board
+        self.tracker = self.game.new_line_tracker(player.covered_positions)
+
+    @classmethod
+    async def load(cls, player_id):
+        """Read a player and their game in one query, and their board's item texts"""
+        try:
+            player = await Player.objects.select_related('game', 'game__winner').aget(id=player_id)
+        except Player.DoesNotExist:
+            return None
+        item_ids = await aplayer_item_ids(player)
+        items = await item_tables.aget(player.game.board_id, item_ids)
+        return cls(coverage_buffer.apply_pending(player), item_ids, items)
+
+    async def reload(self):
+        """Replace the cached rows with fresh copies from the database"""
+        fresh = await self.load(self.player.id)
+        if fresh is None:
+            logger.warning(f"Player {self.player.id} disappeared while connected")
+            return
+        self.player, self.game, self.tracker = fresh.player, fresh.game, fresh.tracker
+        self.item_ids, self.items = fresh.item_ids, fresh.items
+
+    def text(self, position: int) -> str:
+        return self.items.text(self.item_ids[position])
+
+    @property
+    def texts(self) -> list:
+        return self.items.texts(self.item_ids)
+
+    def is_covered(self, position: int) -> bool:
+        return self.tracker.is_covered(position)
+
+    def toggle(self, position: int) -> bool:
+        """Flip a square in memory and return whether it is now covered"""
+        covered = self.tracker.toggle(position)
+        self.player.covered_mask = self.tracker.mask
+        return covered
+
+    async def reset_board(self):
+        """Pick up a new layout and coverage already set on the player"""
+        self.item_ids = await aplayer_item_ids(self.player)
+        self.items = await item_tables.aget(self.game.board_id, self.item_ids)
+        self.tracker = self.game.new_line_tracker(self.player.covered_positions)
+
+    @property
+    def has_won(self) -> bool:
+        return self.tracker.has_won
+
+
+def invalidate_sessions(game_code: str, player_id: int = None):
+    """Ask connected consumers of a game to reload their session.
+
+    With no ``player_id`` every consumer reloads; otherwise only that player's.
+    """
+    group_send_sync(
+        game_code,
+        {
+            'type': 'session_invalidate',
+            'player_id': player_id,
+        },
+        spectators=False,
+    )
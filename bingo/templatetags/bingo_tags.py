@@ -1,4 +1,6 @@
 from django import template
+from django.utils.safestring import mark_safe
+from bingo.fragments import fragments
 
 register = template.Library()
 
@@ -6,16 +8,10 @@ register = template.Library()
 def zip_lists(a, b):
     return zip(a, b)
 
-@register.inclusion_tag('bingo/partials/bingo_board.html')
+@register.simple_tag
 def bingo_board(player, game):
-    context = {
-        'player': player,
-        'game': game,
-        'board_items': player.board_layout,
-        'board_positions': range(player.game.board_size * player.game.board_size)
-    }
-    print("Bingo Board Tag Included")
-    return context
+    """Renders bingo_board.html in one pass instead of one inclusion tag per cell."""
+    return mark_safe(fragments.render_board(player, game))
 
 @register.inclusion_tag('bingo/partials/bingo_cell.html')
 def bingo_cell(item, position, player, game):
@@ -1,3 +1,100 @@
-from django.test import TestCase
+import threading
+import time
+from unittest import mock
+from asgiref.sync import async_to_sync
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from .models import User, BingoBoard, BingoBoardItem, BingoGame, Player, GameEvent
+from .presence import presence
+from .ratelimit import RateLimiter
+from .replay import LocalReplay, replay
+from .wincheck import LineTracker
+from . import timeline
 
-# Create your tests here.
+
+@override_settings(PRESENCE={'BACKEND': 'local'})
+@mock.patch.object(presence, '_backend', None)
+class AdminChangelistQueryTests(TestCase):
+    """A changelist page runs the same number of queries however many rows it shows"""
+
+    changelists = ['bingoboard', 'bingogame', 'player', 'gameevent']
+
+    def setUp(self):
+        self.admin = User.objects.create_superuser(username='admin', password='admin')
+        self.client.force_login(self.admin)
+
+    def add_rows(self, count):
+        for i in range(count):
+            user = User.objects.create(username=f'creator {User.objects.count()}')
+            board = BingoBoard.objects.create(name=f'Board {i}', creator=user)
+            BingoBoardItem.objects.bulk_create(BingoBoardItem(board=board, text=f'item {n}') for n in range(3))
+            game = BingoGame.objects.create(board=board, creator=user)
+            players = [Player.objects.create(game=game, name=f'Player {n}') for n in range(2)]
+            game.winner = players[0]
+            game.save()
+            GameEvent.objects.bulk_create(GameEvent(game=game, player=player, message='hi') for player in players)
+
+    def queries(self, changelist):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse(f'admin:bingo_{changelist}_changelist'))
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_constant_queries_per_page(self):
+        self.add_rows(2)
+        few = {changelist: self.queries(changelist) for changelist in self.changelists}
+        self.add_rows(8)
+        many = {changelist: self.queries(changelist) for changelist in self.changelists}
+        self.assertEqual(few, many)
+
+
+@override_settings(RATE_LIMITS={'GAME': {'mark_position': (1, 5)}})
+class RateLimiterTests(SimpleTestCase):
+    def check_in_thread(self, limiter, buckets):
+        """check() run with a deadline, so a deadlock fails the test instead of hanging it"""
+        result = []
+        thread = threading.Thread(target=lambda: result.append(limiter.check(buckets, 'ABC', 'mark_position')), daemon=True)
+        thread.start()
+        thread.join(timeout=5)
+        self.assertFalse(thread.is_alive(), 'check() did not return')
+        return result[0]
+
+    def test_drained_game_bucket_returns_retry_delay(self):
+        limiter = RateLimiter()
+        # A fresh connection each time, so only the game bucket runs dry
+        for _ in range(5):
+            self.assertIsNone(self.check_in_thread(limiter, {}))
+        retry_after = self.check_in_thread(limiter, {})
+        self.assertIsNotNone(retry_after)
+        self.assertGreater(retry_after, 0)
+        self.assertEqual(limiter.stats()['message_types']['mark_position']['throttled_game'], 1)
+
+
+class TimelineSeedTests(TestCase):
+    def test_events_appended_before_seeding_keep_stored_history(self):
+        user = User.objects.create(username='creator')
+        board = BingoBoard.objects.create(name='Board', creator=user)
+        game = BingoGame.objects.create(board=board, creator=user)
+        player = Player.objects.create(game=game, name='Player')
+        GameEvent.objects.bulk_create(GameEvent(game=game, player=player, message=f'old {n}') for n in range(10))
+        with mock.patch.object(replay, '_backend', LocalReplay()):
+            # The first event after a restart arrives before any page load
+            event = {'player': 'Player', 'message': 'new', 'created_at': time.time() * 1000, 'player_id': player.id}
+            async_to_sync(replay.append_event)(game.code, event)
+            seq, events, next_cursor = timeline.events_page(game, limit=5)
+        self.assertEqual(seq, 1)
+        self.assertEqual([event['message'] for event in events], ['new', 'old 9', 'old 8', 'old 7', 'old 6'])
+        self.assertIsNotNone(next_cursor)
+
+
+class LineTrackerTests(SimpleTestCase):
+    def test_off_board_positions_leave_the_mask_alone(self):
+        tracker = LineTracker(5, covered=[3])
+        for position in (-1, 25, 99):
+            with self.assertRaises(ValueError):
+                tracker.mark(position)
+            with self.assertRaises(ValueError):
+                tracker.unmark(position)
+        self.assertEqual(tracker.mask, 1 << 3)
@@ -0,0 +1,112 @@
+# bingo/timeline.py
+"""A game's recent events for page loads, served from the replay buffer.
+
+build_player_event already appends every event to the game's bounded
+buffer in bingo/replay.py, in process or in Redis. The play page, the
+spectate page and reconnecting spectators read their first events from
+there, without touching the database. Only a cold buffer, e.g. after a
+restart or once an idle game's history expired, is filled from the
+database first, with one query.
+"""
+import time
+from datetime import timedelta
+from channels.db import database_sync_to_async
+from django.conf import settings
+from .models import GameEvent
+from .replay import replay, DEFAULTS as REPLAY_DEFAULTS
+from .utils import EPOCH, EVENTS_PAGE_SIZE, event_cursor, get_events_page
+
+# Seconds an event stays on a player's page
+LATEST_LIFETIME = 60
+
+
+def _buffer_size():
+    return getattr(settings, 'REPLAY', {}).get('EVENTS', REPLAY_DEFAULTS['EVENTS'])
+
+
+def _stored_events(game) -> list:
+    """The newest events in the database, oldest first, as the buffer stores them"""
+    rows = (
+        GameEvent.objects.filter(game=game)
+        .order_by('-created_at', '-id')
+        .values('created_at', 'message', 'player_id', 'player__name')[:_buffer_size()]
+    )
+    return [
+        {
+            'player': row['player__name'],
+            'message': row['message'],
+            'created_at': row['created_at'].timestamp() * 1000,
+            'player_id': row['player_id'],
+        }
+        for row in reversed(rows)
+    ]
+
+
+def recent(game) -> tuple:
+    """The game's current sequence number and buffered events newest first, seeding a cold buffer"""
+    buffered = replay.recent_sync(game.code)
+    if buffered is None:
+        replay.seed_sync(game.code, _stored_events(game))
+        buffered = replay.recent_sync(game.code) or (0, [])
+    seq, entries = buffered
+    return seq, [dict(event, seq=entry_seq) for entry_seq, event in reversed(entries)]
+
+
+async def arecent(game) -> tuple:
+    buffered = await replay.recent(game.code)
+    if buffered is None:
+        await replay.seed(game.code, await database_sync_to_async(_stored_events)(game))
+        buffered = await replay.recent(game.code) or (0, [])
+    seq, entries = buffered
+    return seq, [dict(event, seq=entry_seq) for entry_seq, event in reversed(entries)]
+
+
+def _latest(events) -> list:
+    max_age = time.time() * 1000 - LATEST_LIFETIME * 1000
+    return [
+        dict(event, remove_in=max(0, (event['created_at'] - max_age) / 1000))
+        for event in events
+        if event['created_at'] > max_age
+    ]
+
+
+def latest_events(game) -> tuple:
+    """The sequence number and the events of the last minute, newest first, for a player's page"""
+    seq, events = recent(game)
+    return seq, _latest(events)
+
+
+async def alatest_events(game) -> tuple:
+    seq, events = await arecent(game)
+    return seq, _latest(events)
+
+
+def _page(seq, events, limit):
+    page = events[:limit]
+    # Keep events sharing the last one's time together, so the cursor can be on time alone
+    while len(page) < len(events) and events[len(page)]['created_at'] == page[-1]['created_at']:
+        page.append(events[len(page)])
+    if len(page) == len(events):
+        if len(events) >= _buffer_size():
+            # The buffer may have dropped older events; only the database knows
+            return None
+        return seq, page, None
+    oldest = EPOCH + timedelta(microseconds=round(page[-1]['created_at'] * 1000))
+    return seq, page, event_cursor(oldest, 0)
+
+
+def events_page(game, limit=EVENTS_PAGE_SIZE) -> tuple:
+    """The sequence number, newest page of a spectator's history and the cursor of the next page"""
+    seq, events = recent(game)
+    page = _page(seq, [dict(event, remove_in=0) for event in events], limit)
+    if page is None:
+        return (seq, *get_events_page(game, limit=limit))
+    return page
+
+
+async def aevents_page(game, limit=EVENTS_PAGE_SIZE) -> tuple:
+    seq, events = await arecent(game)
+    page = _page(seq, [dict(event, remove_in=0) for event in events], limit)
+    if page is None:
+        return (seq, *await database_sync_to_async(get_events_page)(game, limit=limit))
+    return page
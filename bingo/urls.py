@@ -19,6 +19,8 @@ urlpatterns = [
     path('join/<str:code>/', views.join_game, name='join_game'),
     path('join/<str:code>/random-nickname', views.random_nickname, name="random_nickname"),
     path('spectate/<str:code>/', views.spectate, name='spectate'),
+    path('spectate/<str:code>/events', views.spectate_events, name='spectate_events'),
+    path('spectate/<str:code>/events.ndjson', views.spectate_export, name='spectate_export'),
     path('play/<int:player_id>/', views.play_game, name='play_game'),
     path('play/<int:player_id>/share', views.share_game, name='share_game'),
     re_path(r'^submit-feedback(?:/(?P<player_id>\d+))?$', views.submit_feedback, name='submit-feedback'),
@@ -26,6 +28,8 @@ urlpatterns = [
     path('review-suggestions/', views.review_suggestions, name='review_suggestions'),
     path('approve-item/<int:item_id>/', views.approve_item, name='approve_item'),
     path('deny-item/<int:item_id>/', views.deny_item, name='deny_item'),
+    path('rate-limits/', views.rate_limit_stats, name='rate_limit_stats'),
+    path('item-pools/', views.item_pool_stats, name='item_pool_stats'),
     
     # API routes
     path('api/', include(router.urls)),
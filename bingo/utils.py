@@ -1,38 +1,63 @@
 import random
+from datetime import datetime, timedelta, timezone as dt_timezone
 
-from django.utils import timezone
+from django.db.models import Q
 from .models import BingoGame, BingoBoard, Player, BingoBoardItem, GameEvent
 
-def get_latest_events(game:BingoGame) -> list:
-    lifetime = 60
-    now = timezone.now()
-    max_age = now - timezone.timedelta(seconds=lifetime)
+# Events per page of a spectator's history
+EVENTS_PAGE_SIZE = 50
+# Events read per query when exporting a whole history
+EXPORT_BATCH_SIZE = 1000
 
-    recent_events = GameEvent.objects.filter(game=game, created_at__gt=max_age)
+EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+
+
+def event_cursor(created_at, event_id) -> str:
+    """A position in a game's history: the event's time in whole microseconds and its id"""
+    return f"{(created_at - EPOCH) // timedelta(microseconds=1)}_{event_id}"
 
-    result = [  {
-                    'player': event.player,
-                    'message': event.message,
-                    'remove_in': max(0, (event.created_at - max_age).total_seconds()),
-                    'created_at': event.created_at.timestamp() * 1000,
-                }
-                for event in recent_events
-            ]
-    return result
 
+def parse_event_cursor(cursor:str) -> tuple:
+    """The (created_at, id) of an event_cursor. Raises ValueError for anything else."""
+    micros, event_id = cursor.split('_')
+    return EPOCH + timedelta(microseconds=int(micros)), int(event_id)
 
-def get_all_events(game:BingoGame) -> list:
-    recent_events = GameEvent.objects.filter(game=game)
 
-    result = [  {
-                    'player': event.player,
-                    'message': event.message,
+def _history(game:BingoGame, after=None, before=None):
+    """A game's events as dicts, strictly after or before a (created_at, id) position"""
+    events = GameEvent.objects.filter(game=game)
+    if after:
+        events = events.filter(Q(created_at__gt=after[0]) | Q(created_at=after[0], id__gt=after[1]))
+    if before:
+        events = events.filter(Q(created_at__lt=before[0]) | Q(created_at=before[0], id__lt=before[1]))
+    return events.values('id', 'created_at', 'message', 'player__name')
+
+
+def get_events_page(game:BingoGame, before=None, limit:int = EVENTS_PAGE_SIZE) -> tuple:
+    """Newest events first, up to ``limit`` older than ``before``, and the cursor of the page after them"""
+    rows = list(_history(game, before=before).order_by('-created_at', '-id')[:limit + 1])
+    next_cursor = event_cursor(rows[limit - 1]['created_at'], rows[limit - 1]['id']) if len(rows) > limit else None
+    events = [  {
+                    'player': row['player__name'],
+                    'message': row['message'],
                     'remove_in': 0,
-                    'created_at': event.created_at.timestamp() * 1000,
+                    'created_at': row['created_at'].timestamp() * 1000,
                 }
-                for event in recent_events
+                for row in rows[:limit]
             ]
-    return result
+    return events, next_cursor
+
+
+async def aiter_events(game:BingoGame, batch_size:int = EXPORT_BATCH_SIZE):
+    """Every event of a game, oldest first, read a batch at a time so memory stays flat"""
+    after = None
+    while True:
+        rows = [row async for row in _history(game, after=after).order_by('created_at', 'id')[:batch_size]]
+        for row in rows:
+            yield row
+        if len(rows) < batch_size:
+            return
+        after = (rows[-1]['created_at'], rows[-1]['id'])
 
 
 def generate_silly_nickname(game:BingoGame, unique:bool = True) -> str:
@@ -4,25 +4,50 @@ from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth import login, logout
 from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth.decorators import login_required
-from django.http import HttpRequest, HttpResponse, JsonResponse
-from django.views.decorators.http import require_http_methods
+from django.http import HttpRequest, HttpResponse, HttpResponseBadRequest, JsonResponse, StreamingHttpResponse
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition, require_http_methods
 from django.urls import reverse
 from .models import BingoGame, BingoBoard, Player, BingoBoardItem, GameEvent
 from .forms import LoginForm, PlayerNameForm, FeedbackForm
-from .utils import get_latest_events, get_all_events, generate_silly_nickname
+from .utils import get_events_page, parse_event_cursor, aiter_events, generate_silly_nickname
+from .writebehind import coverage_buffer
+from .protocol import requested_protocol
+from .ratelimit import rate_limiter
+from . import timeline
+from .layouts import snapshots
+from . import lobby
+from . import gamecodes
 import logging
 
 logger = logging.getLogger(__name__)
 
 
+def lobby_etag(request):
+    # Signed-in users see their own boards, so only anonymous pages can be revalidated
+    if request.user.is_authenticated:
+        return None
+    return lobby.current()['etag']
+
+def lobby_modified(request):
+    if request.user.is_authenticated:
+        return None
+    return lobby.current()['modified']
+
+@cache_control(no_cache=True)
+@condition(etag_func=lobby_etag, last_modified_func=lobby_modified)
 def home(request):
+    current = lobby.current()
     context = {
-        'games': BingoGame.objects.filter(is_active=True).exclude(is_private=True).order_by('-created_at'),
+        'games': current['games'],
+        'lobby_etag': current['etag'],
+        'lobby_version': current['version'],
+        'code_pattern': gamecodes.input_pattern(),
     }
     
     if request.user.is_authenticated:
         context.update({
-            'boards': BingoBoard.objects.filter(creator=request.user).order_by('-created_at'),
+            'boards': lobby.boards(request.user),
             # 'games': BingoGame.objects.filter(creator=request.user).order_by('-created_at')
         })
     
@@ -71,7 +96,7 @@ def join_game(request, code):
                 player = Player.objects.create(
                     game=game,
                     name=form.cleaned_data['nickname'],
-                    board_layout=game.generate_board_layout(use_suggested_items),
+                    layout=game.generate_board_layout(use_suggested_items),
                     covered_positions=[12] if game.has_free_square else [],
                     use_suggested_items=use_suggested_items,
                 )
@@ -109,13 +134,15 @@ def join_game(request, code):
 
 
 def play_game(request, player_id):
-    player = get_object_or_404(Player, id=player_id)
+    player = coverage_buffer.apply_pending(get_object_or_404(Player, id=player_id))
     game = player.game
-    if not game.is_active and not player.has_won:
+    if game.code is None or (not game.is_active and not player.has_won):
+        # A game without a code ended long ago and gave its code to a newer one
         return redirect('home')
     join_path = reverse('join_game', kwargs={'code': game.code})
     share_url = request.build_absolute_uri(join_path)
-    events = get_latest_events(game)
+    # Read together, so the socket asks for exactly what came after these events
+    last_seq, events = timeline.latest_events(game)
     
     return render(request, 'bingo/play_game.html', {
         'user': request.user,
@@ -125,17 +152,55 @@ def play_game(request, player_id):
         'board_positions': range(game.board_size*game.board_size),
         'url': share_url,
         'events': events,
+        'ws_protocol': requested_protocol(request),
+        'last_seq': last_seq,
     })
 
 def spectate(request, code):
     game = get_object_or_404(BingoGame, code=code)
-    events = get_all_events(game=game)
+    # Only the newest page; older ones load as the list is scrolled
+    last_seq, events, next_cursor = timeline.events_page(game)
     context = {
         'game': game,
         'events': events,
+        'next_cursor': next_cursor,
+        'ws_protocol': requested_protocol(request),
+        'last_seq': last_seq,
     }
     return render(request, 'bingo/spectate.html', context=context)
 
+def spectate_events(request, code):
+    game = get_object_or_404(BingoGame, code=code)
+    try:
+        before = parse_event_cursor(request.GET.get('before', ''))
+    except ValueError:
+        return HttpResponseBadRequest('Invalid cursor')
+    events, next_cursor = get_events_page(game, before=before)
+    return render(request, 'bingo/partials/event_page.html', {
+        'game': game,
+        'events': events,
+        'next_cursor': next_cursor,
+    })
+
+async def spectate_export(request, code):
+    game = await BingoGame.objects.filter(code=code).afirst()
+    if game is None:
+        return HttpResponse(status=404)
+
+    async def lines():
+        async for row in aiter_events(game):
+            yield json.dumps({
+                'id': row['id'],
+                'created_at': row['created_at'].isoformat(),
+                'player': row['player__name'],
+                'message': row['message'],
+            }) + '\n'
+
+    # Async, so daphne streams it batch by batch instead of buffering the whole history
+    response = StreamingHttpResponse(lines(), content_type='application/x-ndjson')
+    response['Content-Disposition'] = f'attachment; filename="game-{game.code}-events.ndjson"'
+    return response
+
 def login_view(request):
     if request.method == 'POST':
         form = LoginForm(request.POST)
@@ -185,6 +250,16 @@ def deny_item(request, item_id):
     item.save()
     return HttpResponse('')
 
+@staff_member_required
+def rate_limit_stats(request):
+    """Socket rate-limit counters for this process"""
+    return JsonResponse(rate_limiter.stats())
+
+@staff_member_required
+def item_pool_stats(request):
+    """Board item pool cache hit rates for this process"""
+    return JsonResponse(snapshots.stats())
+
 def share_game(request: HttpRequest, player_id: int):
     try:
         player: Player = get_object_or_404(Player, id=player_id)
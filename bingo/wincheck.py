@@ -0,0 +1,143 @@
+# bingo/wincheck.py
+"""Bitboard win detection.
+
+Board position ``p`` is bit ``1 << p``. Winning patterns are precomputed once
+per (board size, win condition) as integer masks, so a win check is a handful
+of AND/compare operations instead of rebuilding every row, column and diagonal.
+"""
+from functools import lru_cache
+
+
+def positions_to_mask(positions) -> int:
+    """Pack an iterable of board positions into a bitmask"""
+    mask = 0
+    for position in positions:
+        mask |= 1 << int(position)
+    return mask
+
+
+def mask_to_positions(mask: int) -> list:
+    """Unpack a bitmask into a sorted list of board positions"""
+    positions = []
+    position = 0
+    while mask:
+        if mask & 1:
+            positions.append(position)
+        mask >>= 1
+        position += 1
+    return positions
+
+
+@lru_cache(maxsize=None)
+def winning_lines(size: int, win_condition: str = 'traditional') -> tuple:
+    """The winning patterns for a board, each as a tuple of positions"""
+    if win_condition == 'all':
+        return (tuple(range(size * size)),)
+
+    lines = []
+    # Rows
+    for i in range(size):
+        lines.append(tuple(range(i * size, (i + 1) * size)))
+    # Columns
+    for i in range(size):
+        lines.append(tuple(range(i, size * size, size)))
+    # Diagonals
+    lines.append(tuple(range(0, size * size, size + 1)))
+    lines.append(tuple(range(size - 1, size * (size - 1) + 1, size - 1)))
+    return tuple(lines)
+
+
+@lru_cache(maxsize=None)
+def winning_masks(size: int, win_condition: str = 'traditional') -> tuple:
+    """The winning patterns for a board as integer masks"""
+    return tuple(positions_to_mask(line) for line in winning_lines(size, win_condition))
+
+
+@lru_cache(maxsize=None)
+def lines_through(size: int, win_condition: str = 'traditional') -> tuple:
+    """For every position, the indexes of the winning lines that contain it"""
+    lines = winning_lines(size, win_condition)
+    return tuple(
+        tuple(index for index, line in enumerate(lines) if position in line)
+        for position in range(size * size)
+    )
+
+
+def is_win(mask: int, size: int, win_condition: str = 'traditional') -> bool:
+    """Check a coverage bitmask against the precomputed winning masks"""
+    for pattern in winning_masks(size, win_condition):
+        if mask & pattern == pattern:
+            return True
+    return False
+
+
+class LineTracker:
+    """Incremental win tracking for a single player's board.
+
+    Keeps the number of uncovered squares left on every winning line, so a
+    mark or unmark only touches the lines running through that cell and
+    ``has_won`` is a single comparison.
+    """
+    __slots__ = ('size', 'win_condition', 'mask', 'remaining', 'completed', '_through')
+
+    def __init__(self, size: int, win_condition: str = 'traditional', covered=()):
+        self.size = size
+        self.win_condition = win_condition
+        self._through = lines_through(size, win_condition)
+        self.reset(covered)
+
+    def reset(self, covered=()):
+        self.mask = 0
+        self.remaining = [len(line) for line in winning_lines(self.size, self.win_condition)]
+        self.completed = 0
+        for position in covered:
+            self.mark(position)
+
+    def is_covered(self, position: int) -> bool:
+        return bool(self.mask >> position & 1)
+
+    def _bit(self, position: int) -> int:
+        if not 0 <= position < self.size * self.size:
+            raise ValueError(f"Position {position} is not on a {self.size}x{self.size} board")
+        return 1 << position
+
+    def mark(self, position: int) -> bool:
+        """Cover a square. Returns False if it was already covered."""
+        bit = self._bit(position)
+        if self.mask & bit:
+            return False
+        self.mask |= bit
+        remaining = self.remaining
+        for line in self._through[position]:
+            remaining[line] -= 1
+            if remaining[line] == 0:
+                self.completed += 1
+        return True
+
+    def unmark(self, position: int) -> bool:
+        """Uncover a square. Returns False if it was not covered."""
+        bit = self._bit(position)
+        if not self.mask & bit:
+            return False
+        self.mask &= ~bit
+        remaining = self.remaining
+        for line in self._through[position]:
+            if remaining[line] == 0:
+                self.completed -= 1
+            remaining[line] += 1
+        return True
+
+    def toggle(self, position: int) -> bool:
+        """Flip a square and return whether it is now covered"""
+        if self.unmark(position):
+            return False
+        self.mark(position)
+        return True
+
+    @property
+    def has_won(self) -> bool:
+        return self.completed > 0
+
+    @property
+    def positions(self) -> list:
+        return mask_to_positions(self.mask)
@@ -0,0 +1,144 @@
+# bingo/writebehind.py
+import atexit
+import logging
+import threading
+import time
+from django.conf import settings
+from django.db import close_old_connections
+from channels.db import database_sync_to_async
+from .background import BackgroundTask
+from .models import Player
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'ENABLED': False,
+    'FLUSH_INTERVAL': 1.0,   # seconds between background flushes
+    'MAX_STALENESS': 5.0,    # force a flush once a pending write is this old
+}
+
+
+class CoverageBuffer(BackgroundTask):
+    """Write-behind buffer for Player.covered_mask.
+
+    Instead of saving the player row on every click, consumers hand the player
+    to the buffer and a background task writes every dirty player with a single
+    ``bulk_update``. Pending writes are also flushed when a player disconnects
+    and when the process exits.
+    """
+    fields = ['covered_mask', 'has_won']
+
+    def __init__(self):
+        super().__init__()
+        self._lock = threading.Lock()
+        self._pending = {}      # player id -> snapshot Player
+        self._dirty_since = {}  # player id -> monotonic time of the oldest unflushed change
+
+    def _config(self, key):
+        return getattr(settings, 'COVERAGE_WRITE_BEHIND', {}).get(key, DEFAULTS[key])
+
+    @property
+    def enabled(self) -> bool:
+        return self._config('ENABLED')
+
+    def add(self, player: Player):
+        """Queue the player's current coverage for the next flush"""
+        snapshot = Player(
+            id=player.id,
+            covered_mask=player.covered_mask,
+            has_won=player.has_won,
+        )
+        now = time.monotonic()
+        with self._lock:
+            self._pending[player.id] = snapshot
+            self._dirty_since.setdefault(player.id, now)
+            # Insertion ordered, so the first entry is the oldest
+            oldest = next(iter(self._dirty_since.values()))
+        if now - oldest >= self._config('MAX_STALENESS'):
+            self.wake()
+
+    def discard(self, player_id: int):
+        """Forget a pending write, e.g. because the row is about to be rewritten"""
+        with self._lock:
+            self._pending.pop(player_id, None)
+            self._dirty_since.pop(player_id, None)
+
+    def apply_pending(self, player: Player) -> Player:
+        """Overlay buffered coverage onto a player freshly read from the database"""
+        with self._lock:
+            snapshot = self._pending.get(player.id)
+        if snapshot is not None:
+            player.covered_mask = snapshot.covered_mask
+            player.has_won = snapshot.has_won
+        return player
+
+    def _take(self, player_ids):
+        with self._lock:
+            if player_ids is None:
+                batch, self._pending = self._pending, {}
+                self._dirty_since = {}
+            else:
+                batch = {
+                    player_id: self._pending.pop(player_id)
+                    for player_id in player_ids if player_id in self._pending
+                }
+                for player_id in batch:
+                    self._dirty_since.pop(player_id, None)
+        return batch
+
+    def _restore(self, batch):
+        # Put the writes back unless something newer arrived meanwhile
+        now = time.monotonic()
+        with self._lock:
+            for player_id, snapshot in batch.items():
+                if player_id not in self._pending:
+                    self._pending[player_id] = snapshot
+                    self._dirty_since.setdefault(player_id, now)
+
+    def flush(self, player_ids=None) -> int:
+        """Write pending players to the database. Must run off the event loop."""
+        batch = self._take(player_ids)
+        if not batch:
+            return 0
+        try:
+            Player.objects.bulk_update(batch.values(), self.fields)
+        except Exception:
+            self._restore(batch)
+            raise
+        return len(batch)
+
+    async def aflush(self, player_ids=None) -> int:
+        """Async version of flush for consumers"""
+        batch = self._take(player_ids)
+        if not batch:
+            return 0
+        try:
+            await Player.objects.abulk_update(batch.values(), self.fields)
+        except Exception:
+            self._restore(batch)
+            raise
+        return len(batch)
+
+    async def _run(self):
+        while True:
+            await self.wait(self._config('FLUSH_INTERVAL'))
+            if not self._pending:
+                continue
+            try:
+                count = await database_sync_to_async(self.flush)()
+                if count:
+                    logger.debug(f"Flushed coverage for {count} players")
+            except Exception:
+                logger.exception("Error flushing buffered coverage")
+
+    def shutdown(self):
+        try:
+            self.flush()
+        except Exception:
+            logger.exception("Error flushing buffered coverage on shutdown")
+        finally:
+            close_old_connections()
+
+
+coverage_buffer = CoverageBuffer()
+atexit.register(coverage_buffer.shutdown)
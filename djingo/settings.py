@@ -25,6 +25,92 @@ if load_dotenv:
     load_dotenv(str(BASE_DIR / '.env'))
 
 FORGET_GAME_EVENTS = False
+# Events of games that ended COMPACT_AFTER seconds ago, and any older than
+# KEEP_RAW, are folded into per-game summaries by compact_game_events; raw rows
+# older than KEEP_RAW are then deleted. Work is done BATCH_SIZE rows at a time.
+GAME_EVENT_RETENTION = {
+    'COMPACT_AFTER': 24 * 3600,
+    'KEEP_RAW': 30 * 24 * 3600,
+    'BATCH_SIZE': 500,
+    'PAUSE': 0.05,
+}
+# Buffer covered_mask writes and flush them with one bulk_update instead
+# of saving the player on every click. Intervals are in seconds.
+COVERAGE_WRITE_BEHIND = {
+    'ENABLED': False,
+    'FLUSH_INTERVAL': 1.0,
+    'MAX_STALENESS': 5.0,
+}
+# Game events are broadcast immediately and saved in batches in the background.
+GAME_EVENT_SINK = {
+    'ENABLED': True,
+    'BATCH_SIZE': 200,
+    'FLUSH_INTERVAL': 0.5,
+}
+# Connected players are tracked on the channel layer's Redis. Connections
+# that miss heartbeats for TTL seconds are treated as gone.
+PRESENCE = {
+    'TTL': 60,
+    'HEARTBEAT': 20,
+}
+# Marks are held per game for WINDOW seconds, then each player's marks go out
+# as one summarised event. Mark-then-unmark of the same square cancels out.
+EVENT_COALESCING = {
+    'ENABLED': True,
+    'WINDOW': 0.5,
+}
+# Token buckets per socket message type as (tokens per second, burst), for
+# each connection and for each game; '*' covers unlisted types. Messages
+# over the limit are dropped. Anything left out keeps its default.
+RATE_LIMITS = {
+    'ENABLED': True,
+}
+# Game groups are split into shards so one group_send never has to reach
+# thousands of channels. Spectator shards are published after player shards.
+GAME_GROUPS = {
+    'PLAYER_SHARDS': 1,
+    'SPECTATOR_SHARDS': 1,
+}
+# 'html' sends rendered fragments over the game sockets; 'delta' sends compact
+# JSON the page applies itself. A page can override it with ?proto=.
+WEBSOCKET_PROTOCOL = 'html'
+# Board item pools used to deal new boards. CACHE names a cache shared by all
+# workers (e.g. a RedisCache in CACHES); every new board reads its pool from
+# there, so an approved suggestion reaches every process at once. Without one
+# each process keeps its own pool and rechecks after LOCAL_TTL seconds.
+ITEM_POOLS = {
+    'CACHE': None,
+    'LOCAL_TTL': 60,
+    'SHARED_TTL': 3600,
+}
+# The home page's list of open games is cached in CACHE and rebuilt when a game
+# is saved; player counts are refreshed every TTL seconds. Open home pages get
+# count changes over the lobby socket at most every COUNT_INTERVAL seconds.
+# Set DJINGO_VERSION on every deploy, so visitors and the fragment cache drop
+# pages rendered by the old templates.
+LOBBY = {
+    'CACHE': 'default',
+    'TTL': 30,
+    'COUNT_INTERVAL': 2,
+    'VERSION': os.environ.get('DJINGO_VERSION', ''),
+}
+# Game codes are handed out from a pool of free ones. Codes of games that ended
+# RECYCLE_AFTER seconds ago go back into it, and new codes grow a letter longer
+# once MAX_FILL of the shorter ones are in use. See bingo/gamecodes.py.
+GAME_CODES = {
+    'MIN_LENGTH': 3,
+    'LOW_WATER': 200,
+    'REFILL': 2000,
+    'MAX_FILL': 0.75,
+    'RECYCLE_AFTER': 30 * 24 * 3600,
+}
+# Recent events and board changes kept per game so reconnecting sockets get
+# only what they missed. Stored in Redis when the channel layer uses it.
+REPLAY = {
+    'EVENTS': 200,   # events kept per game
+    'CELLS': 100,    # board changes kept per player
+    'TTL': 3600,     # seconds an idle game's history is kept
+}
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/5.1/howto/deployment/checklist/
 
@@ -100,9 +186,11 @@ TEMPLATES = [
 ]
 
 ASGI_APPLICATION = 'djingo.asgi.application'
+# Same-process members are served from memory; Redis carries the rest.
+# Leave out 'hosts' to run a single node without Redis.
 CHANNEL_LAYERS = {
     'default': {
-        'BACKEND': 'channels_redis.core.RedisChannelLayer',
+        'BACKEND': 'bingo.layers.HybridChannelLayer',
         'CONFIG': {
             "hosts": [('127.0.0.1', 6379)],
         },
@@ -96,4 +96,157 @@ document.addEventListener('DOMContentLoaded', () => {
         observer.observe(topTarget)
         observer.observe(bottomTarget)
     }
-})
\ No newline at end of file
+})
+
+// Compact JSON deltas, see bingo/protocol.py. A page opts in with
+// data-ws-protocol="delta" on its ws-connect element; HTML fragments such as
+// modals still go through htmx as usual.
+const DELTA_SUBPROTOCOL = 'bingo.delta.v1'
+const htmlWebSocket = htmx.createWebSocket
+
+// Resuming, see bingo/replay.py. We remember the newest event number seen and
+// send it back on every reconnect, so the server sends only what we missed.
+let lastSeq = null
+
+function noteSeq(seq) {
+    seq = parseInt(seq)
+    if (!isNaN(seq) && (lastSeq === null || seq > lastSeq)) lastSeq = seq
+}
+
+function resumeUrl(url) {
+    const elt = document.querySelector('[ws-connect][data-last-seq]')
+    if (!elt) return url
+    if (lastSeq === null) noteSeq(elt.dataset.lastSeq)
+    if (lastSeq === null) return url
+    const resumed = new URL(url, window.location.href)
+    resumed.searchParams.set('last_seq', lastSeq)
+    return resumed.toString()
+}
+
+htmx.createWebSocket = url => {
+    url = resumeUrl(url)
+    if (!document.querySelector('[ws-connect][data-ws-protocol="delta"]')) {
+        return htmlWebSocket ? htmlWebSocket(url) : new WebSocket(url, [])
+    }
+    const socket = new WebSocket(url, [DELTA_SUBPROTOCOL])
+    socket.binaryType = htmx.config.wsBinaryType
+    return socket
+}
+
+function setCovered(cell, covered) {
+    cell.classList.toggle('covered', covered)
+    if (covered) {
+        cell.dataset.covered = 'true'
+    } else {
+        delete cell.dataset.covered
+    }
+}
+
+function cellElement(position, text, covered, free) {
+    const cell = document.createElement('div')
+    cell.className = 'bingo-cell'
+    cell.id = `cell-${position}`
+    cell.dataset.position = position
+    setCovered(cell, covered)
+    if (free) {
+        cell.dataset.free = 'true'
+    } else {
+        cell.setAttribute('hx-trigger', 'click')
+        cell.setAttribute('hx-swap', 'outerHTML')
+        cell.setAttribute('hx-target', 'this')
+        cell.setAttribute('hx-vals', JSON.stringify({type: 'mark_position', position: String(position)}))
+        cell.setAttribute('hx-ws', 'send')
+    }
+    const span = document.createElement('span')
+    span.className = 'bingo-cell-text'
+    span.textContent = text
+    cell.appendChild(span)
+    return cell
+}
+
+function eventElement(delta) {
+    const item = document.createElement('div')
+    item.className = delta.w ? 'event-item winning-message' : 'event-item'
+    item.dataset.timestamp = delta.ts
+    const message = document.createElement('span')
+    message.className = 'event-message'
+    // Messages carry markup, as in event_item.html
+    message.innerHTML = delta.m
+    const time = document.createElement('span')
+    time.className = 'event-time'
+    time.dataset.timestamp = delta.ts
+    item.append(message, time)
+    if (delta.r) {
+        setTimeout(() => item.remove(), delta.r * 1000)
+    }
+    return item
+}
+
+const deltaHandlers = {
+    m: delta => {
+        const cell = document.getElementById(`cell-${delta.p}`)
+        if (cell) setCovered(cell, !!delta.c)
+    },
+    e: delta => {
+        const list = document.getElementById('events-list')
+        if (list) list.prepend(eventElement(delta))
+    },
+    b: delta => {
+        const old = document.getElementById('bingo-board')
+        if (!old) return
+        const covered = new Set(delta.c)
+        const board = document.createElement('div')
+        board.id = 'bingo-board'
+        board.className = `bingo-board board-${delta.s}x${delta.s}`
+        board.setAttribute('hx-target', '#bingo-board')
+        board.setAttribute('hx-swap', 'outerHTML')
+        delta.i.slice(0, delta.s * delta.s).forEach((text, position) => {
+            board.appendChild(cellElement(position, text, covered.has(position), position === delta.f))
+        })
+        old.replaceWith(board)
+        htmx.process(board)
+        board.querySelectorAll('.bingo-cell-text').forEach(adjustFontSize)
+    },
+    x: delta => {
+        const notice = document.getElementById('errorMessage')
+        if (!notice) return
+        notice.textContent = 'Slow down a little! Some of your taps were ignored.'
+        notice.style.display = ''
+        clearTimeout(notice.hideTimer)
+        notice.hideTimer = setTimeout(() => { notice.style.display = 'none' }, delta.r * 1000)
+    },
+    s: delta => {
+        // Resync the board, e.g. after a reconnect
+        const covered = new Set(delta.c)
+        document.querySelectorAll('#bingo-board .bingo-cell').forEach(cell => {
+            setCovered(cell, covered.has(parseInt(cell.dataset.position)))
+        })
+    },
+}
+
+document.addEventListener('htmx:wsBeforeMessage', evt => {
+    const message = evt.detail.message
+    if (typeof message !== 'string') return
+    if (message[0] !== '{') {
+        for (const match of message.matchAll(/data-seq="(\d+)"/g)) noteSeq(match[1])
+        return
+    }
+    let delta
+    try {
+        delta = JSON.parse(message)
+    } catch (e) {
+        return
+    }
+    if (delta.t === 's' || delta.type === 'game_state') {
+        // A full state is authoritative, even if the server's numbering started over
+        const seq = parseInt(delta.q ?? delta.seq)
+        if (!isNaN(seq)) lastSeq = seq
+    } else {
+        noteSeq(delta.q)
+    }
+    const handler = deltaHandlers[delta.t]
+    if (handler) {
+        evt.preventDefault()
+        handler(delta)
+    }
+})